@@ -0,0 +1,95 @@
+# gunicorn.conf.py — lido automaticamente pelo gunicorn quando roda a partir de backend/:
+#   gunicorn src.main:app
+#
+# Dois modos (GUNICORN_MODE):
+#   gthread (padrão)  processos x threads; cada thread segura no máximo uma conexão do pool,
+#                     então threads = DB_POOL_SIZE e o overflow fica de folga.
+#   gevent            um processo por núcleo com centenas de greenlets; socket/SMTP/sleep
+#                     viram cooperativos pelo monkey patch do worker e o psycopg2 via
+#                     psycogreen (se instalado). Requer `pip install gevent psycogreen`.
+#
+# Env:
+#   WEB_CONCURRENCY              processos (padrão: 2*núcleos+1 no gthread, núcleos no gevent)
+#   GUNICORN_THREADS             threads por processo no gthread (padrão: DB_POOL_SIZE)
+#   GUNICORN_WORKER_CONNECTIONS  requisições simultâneas por processo no gevent (padrão 200)
+#   DB_MAX_CONNECTIONS           limite de conexões do Postgres para este app: corta os
+#                                processos para workers * (pool + overflow) caber nele
+#   PORT, GUNICORN_TIMEOUT
+#
+# Não importe nada de src aqui: o app tem que ser carregado depois do fork (e, no gevent,
+# depois do monkey patch). Por isso também não há preload_app.
+import importlib.util
+import multiprocessing
+import os
+import sys
+
+mode = os.getenv("GUNICORN_MODE", "gthread").lower()
+if mode not in ("gthread", "gevent"):
+    raise RuntimeError(f"GUNICORN_MODE desconhecido: {mode} (use gthread ou gevent)")
+if mode == "gevent" and importlib.util.find_spec("gevent") is None:
+    raise RuntimeError("GUNICORN_MODE=gevent exige `pip install gevent psycogreen`")
+
+cpus = multiprocessing.cpu_count()
+
+if mode == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+    # com muitas greenlets por processo o pool passa a ser o gargalo; quem excede espera
+    # DB_POOL_TIMEOUT na fila do pool (cooperativo) em vez de abrir conexão
+    os.environ.setdefault("DB_POOL_SIZE", "20")
+    default_workers = cpus
+else:
+    worker_class = "gthread"
+    default_workers = 2 * cpus + 1
+
+# db.py lê as mesmas variáveis nos workers; aqui só para dimensionar
+pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+if mode == "gthread":
+    threads = int(os.getenv("GUNICORN_THREADS", str(pool_size)))
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(default_workers)))
+db_max_connections = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+if db_max_connections:
+    workers = max(1, min(workers, db_max_connections // (pool_size + max_overflow)))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5
+preload_app = False
+accesslog = "-"
+
+
+def when_ready(server):
+    per_worker = worker_connections if mode == "gevent" else threads
+    server.log.info(
+        "modo %s: %d processo(s) x %d requisições simultâneas; pool %d+%d por processo",
+        mode, workers, per_worker, pool_size, max_overflow,
+    )
+    # o limite de envio SMTP é por processo: com vários workers drenando o outbox a
+    # taxa real vira SMTP_RATE_PER_SEC x processos
+    if float(os.getenv("SMTP_RATE_PER_SEC", "0")) > 0 and os.getenv("EMAIL_WORKERS", "2") != "0" and workers > 1:
+        server.log.warning(
+            "SMTP_RATE_PER_SEC vale por processo e %d processos drenam o outbox: use EMAIL_WORKERS=0 "
+            "e um único `python -m src.manage outbox-worker`", workers,
+        )
+
+
+def post_worker_init(worker):
+    # psycopg2 é C e bloquearia o hub do gevent em cada consulta; o callback do
+    # psycogreen faz a espera do socket cooperar com as outras greenlets
+    if mode == "gevent":
+        if importlib.util.find_spec("psycogreen") is not None:
+            from psycogreen.gevent import patch_psycopg
+
+            patch_psycopg()
+        else:
+            worker.log.warning("psycogreen não instalado: consultas ao Postgres bloqueiam o processo")
+
+
+def worker_exit(server, worker):
+    # deixa o envio em andamento terminar antes do processo sair
+    outbox = sys.modules.get("src.outbox")
+    if outbox is not None:
+        outbox.stop_workers(timeout=10)
@@ -0,0 +1,97 @@
+# auth.py — usuário autenticado da requisição sem ida ao banco a cada chamada
+# O "principal" (papel, loja, trava de loja) sai de um cache TTL/LRU por processo,
+# carregado do banco na primeira requisição do usuário. Editar/excluir um usuário
+# incrementa config_versions["users"] na mesma transação: o processo que editou
+# descarta o cache na hora e os demais na próxima conferência da versão (a cada
+# USER_VERSION_CHECK s). Os claims do JWT não são usados para permissão: um usuário
+# rebaixado ou excluído perde o acesso em todos os workers em poucos segundos.
+#
+# Env:
+#   USER_CACHE_TTL      segundos que um usuário carregado do banco fica em cache (0 = sem cache)
+#   USER_CACHE_SIZE     máximo de usuários em cache (LRU)
+#   USER_VERSION_CHECK  segundos entre conferências de config_versions["users"] (0 = toda chamada)
+import hashlib
+import os
+from dataclasses import dataclass
+
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+
+from .db import SessionLocal
+from .models import User
+from .util import TTLCache
+from . import versions
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_VERSION_CHECK = float(os.getenv("USER_VERSION_CHECK", "5"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: str
+    lock_loja: bool
+    store_id: int | None
+    name: str | None = None
+    email: str | None = None
+
+    @property
+    def scope_store_id(self) -> int | None:
+        """Loja à qual o usuário está restrito (None = todas)."""
+        return self.store_id if (self.lock_loja and self.store_id) else None
+
+    @classmethod
+    def from_user(cls, u: User) -> "Principal":
+        return cls(u.id, u.role, bool(u.lock_loja), u.store_id, u.name, u.email)
+
+
+_users = TTLCache(USER_CACHE_TTL, USER_CACHE_SIZE)
+_version = versions.VersionWatch("users", USER_VERSION_CHECK)
+
+
+def users_changed(db) -> None:
+    """Chamar na transação que edita/exclui usuários (antes do commit)."""
+    versions.bump(db, "users")
+
+
+def invalidate_user(uid: int) -> None:
+    """Depois do commit da edição: este processo descarta o usuário na hora."""
+    _users.pop(uid)
+    _version.reset()
+
+
+def password_stamp(password_hash: str) -> str:
+    """Marca do hash atual da senha (vai no refresh token; mudou a senha, o refresh cai)."""
+    return hashlib.sha256((password_hash or "").encode()).hexdigest()[:16]
+
+
+def load_user(uid: int) -> Principal | None:
+    """Usuário atual (None = excluído), passando pelo cache."""
+    db = SessionLocal()  # sessão da requisição (removida no teardown)
+    if _version.poll(db):
+        _users.clear()  # algum usuário mudou em outro processo
+    p = _users.get(uid)
+    if p is not None:
+        return p
+    u = db.get(User, uid)
+    if not u:
+        return None
+    p = Principal.from_user(u)
+    _users.set(uid, p)
+    return p
+
+
+def token_revoked(jwt_header, jwt_payload) -> bool:
+    """token_in_blocklist_loader: token de usuário excluído não vale mais."""
+    return load_user(int(jwt_payload["sub"])) is None
+
+
+def current_user() -> Principal | None:
+    if "principal" in g:
+        return g.principal
+    identity = get_jwt_identity()
+    if not identity:
+        return None
+    g.principal = load_user(int(identity))
+    return g.principal
@@ -0,0 +1,185 @@
+# bench.py — benchmark dos fluxos principais (login, visita, resgate, listagens, dashboard)
+# Sobe um banco descartável (SQLite temporário por padrão, ou --database-url para um
+# Postgres de teste), cria as 7 lojas do seed e a massa sintética, chama cada endpoint
+# N vezes pelo test client do Flask (com --threads em paralelo) e mostra vazão e
+# latência p50/p95/p99. Mede aplicação + banco, sem servidor HTTP na frente.
+#
+#   python -m src.bench --clients 20000 --visits 100000 --json bench-atual.json
+#   python -m src.bench --compare bench-main.json        # sai com 1 se o p95 piorar
+#   python -m src.bench --database-url postgresql://localhost/fidelidade_bench
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import harness
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Percentil por posição (nearest-rank) de uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _measure(app, call, args_list: list, threads: int) -> dict:
+    """Roda call(http, arg) para cada arg e devolve vazão, percentis (ms) e status."""
+    from .db import SessionLocal
+
+    def one(arg):
+        http = app.test_client()
+        started = time.perf_counter()
+        try:
+            status = call(http, arg).status_code
+        finally:
+            SessionLocal.remove()
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, args_list))
+    wall = time.perf_counter() - started
+
+    lat = sorted(r[0] * 1000 for r in results)
+    return {
+        "requests": len(results),
+        "rps": round(len(results) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p95_ms": round(percentile(lat, 95), 2),
+        "p99_ms": round(percentile(lat, 99), 2),
+        "max_ms": round(lat[-1], 2) if lat else 0.0,
+        "status": {str(k): v for k, v in sorted(Counter(r[1] for r in results).items())},
+    }
+
+
+def run(clients: int, visits: int, requests: int, threads: int, warmup: int, seed: int) -> dict:
+    app, http = harness.seeded_client()
+    from sqlalchemy import select
+    from .main import DEFAULT_META
+    from .db import engine, SessionLocal
+    from .models import Store, Client
+    from . import rollups
+
+    harness.populate(clients, visits, seed=seed)
+    db = SessionLocal()
+    mascote = db.execute(select(Store).where(Store.name == "Mascote")).scalar_one()
+    meta = mascote.meta_visitas or DEFAULT_META
+    cpfs = list(db.execute(select(Client.cpf).where(Client.store_id == mascote.id)).scalars())
+    # cada resgate precisa de saldo: repete o CPF quantas vezes o saldo permitir
+    redeemable = [
+        cpf
+        for cpf, balance in db.execute(
+            select(Client.cpf, Client.visits_balance)
+            .where(Client.store_id == mascote.id, Client.visits_balance >= meta)
+        ).all()
+        for _ in range(balance // meta)
+    ]
+    db.close()
+    SessionLocal.remove()
+
+    admin = harness.auth_headers(http, "admin@cdc.com")
+    gerente = harness.auth_headers(http, "gerente.mascote@cdc.com")
+    rng = random.Random(seed)
+
+    def kpis_fresh(h, headers):
+        rollups.kpis_cache.clear()  # mede a consulta do rollup, não o cache
+        return h.get("/api/dashboard/kpis", headers=headers)
+
+    # (nome, chamada, argumentos); visitas e resgates consomem CPFs distintos
+    scenarios = [
+        ("login", lambda h, _: h.post(
+            "/api/auth/login", json={"email": "gerente.mascote@cdc.com", "password": harness.PASSWORD}), None),
+        ("visita", lambda h, cpf: h.post("/api/visitas", json={"cpf": cpf}, headers=gerente),
+         [rng.choice(cpfs) for _ in range(requests + warmup)]),
+        ("resgate", lambda h, cpf: h.post("/api/resgates", json={"cpf": cpf}, headers=gerente),
+         rng.sample(redeemable, min(len(redeemable), requests + warmup))),
+        ("clientes (loja, page)", lambda h, _: h.get("/api/clientes?page=3", headers=gerente), None),
+        ("clientes (loja, cursor)", lambda h, _: h.get("/api/clientes?cursor=", headers=gerente), None),
+        ("clientes (todas, page)", lambda h, _: h.get("/api/clientes?page=3", headers=admin), None),
+        ("kpis (loja)", lambda h, _: kpis_fresh(h, gerente), None),
+        ("kpis (todas)", lambda h, _: kpis_fresh(h, admin), None),
+        ("aniversariantes (loja)", lambda h, _: h.get("/api/dashboard/aniversariantes", headers=gerente), None),
+        ("aniversariantes (todas)", lambda h, _: h.get("/api/dashboard/aniversariantes", headers=admin), None),
+    ]
+
+    results = {}
+    print(f"{'cenário':26} {'req':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  status")
+    for name, call, args_list in scenarios:
+        args_list = args_list if args_list is not None else [None] * (requests + warmup)
+        if len(args_list) <= warmup:
+            print(f"{name:26} sem dados suficientes (aumente --visits)")
+            continue
+        _measure(app, call, args_list[:warmup], threads)
+        r = results[name] = _measure(app, call, args_list[warmup:], threads)
+        status = " ".join(f"{k}:{v}" for k, v in r["status"].items())
+        print(f"{name:26} {r['requests']:6} {r['rps']:8} {r['p50_ms']:8} {r['p95_ms']:8} {r['p99_ms']:8}  {status}")
+
+    return {
+        "rev": _git_rev(),
+        "dialect": engine.dialect.name,
+        "clients": clients,
+        "visits": visits,
+        "threads": threads,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Compara o p95 com uma execução anterior; devolve quantos cenários pioraram."""
+    print(f"\ncomparando com {baseline.get('rev') or 'baseline'} (tolerância {tolerance:.0%} no p95)")
+    worse = 0
+    for name, r in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        delta = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        regressed = delta > tolerance
+        worse += regressed
+        print(f"{'PIOR' if regressed else 'OK  '} {name:26} p95 {old['p95_ms']} -> {r['p95_ms']} ms ({delta:+.0%})")
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.bench")
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--visits", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200, help="requisições medidas por cenário")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    parser.add_argument("--compare", help="resultado anterior (--json) para comparar o p95")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora aceitável do p95 (0.25 = 25%%)")
+    harness.add_database_arg(parser)
+    args = parser.parse_args(argv)
+    harness.use_disposable_db(args.database_url, "bench", VISIT_COOLDOWN_SECONDS="0",
+                              READ_YOUR_WRITES_SECONDS="0")
+
+    result = run(args.clients, args.visits, args.requests, args.threads, args.warmup, args.seed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("dialect") != result["dialect"]:
+            print(f"aviso: baseline em {baseline.get('dialect')}, atual em {result['dialect']}")
+        return 1 if compare(result, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
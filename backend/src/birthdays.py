@@ -0,0 +1,107 @@
+# birthdays.py — campanha de aniversário (parabéns por e-mail + links de WhatsApp)
+# Os aniversariantes do período (hoje ou os próximos N dias) saem de birth_month/
+# birth_day pelos índices ix_clients_birth / ix_clients_store_birth: a rodada diária
+# lê só as linhas daquelas datas. Cada envio fica em birthday_sends (cliente, ano,
+# canal), então rodar de novo no mesmo dia ou na mesma semana não repete ninguém.
+#
+#   python -m src.manage birthday-run [--days 7] [--store ID] [--links links.csv]
+import calendar
+from datetime import date, datetime, timedelta
+from html import escape
+
+from sqlalchemy import select, and_, or_
+
+from .models import Client, Store, BirthdaySend
+from . import emailer, messages, outbox
+
+EMAIL_SUBJECT = "Feliz aniversário, {nome}!"
+EMAIL_TEXT = (
+    "Olá {nome},\n\nA Casa do Cigano deseja um feliz aniversário! "
+    "Passe na loja {loja} e comemore com a gente.\n\nUm abraço,\nCasa do Cigano"
+)
+EMAIL_HTML = (
+    "<p>Olá <b>{nome}</b>,</p><p>A Casa do Cigano deseja um <b>feliz aniversário</b>! "
+    "Passe na loja {loja} e comemore com a gente.</p><p>Um abraço,<br/>Casa do Cigano</p>"
+)
+
+
+def window(today: date, days: int = 1) -> list[date]:
+    """Datas de aniversário cobertas: hoje e os próximos `days - 1` dias."""
+    return [today + timedelta(days=i) for i in range(max(1, days))]
+
+
+def _occurrences(dates: list[date]) -> dict[tuple[int, int], int]:
+    """(mês, dia) -> ano da comemoração (a janela pode atravessar o réveillon).
+    Quem nasceu em 29/02 comemora em 28/02 nos anos não bissextos."""
+    occ = {}
+    for d in dates:
+        occ[(d.month, d.day)] = d.year
+        if (d.month, d.day) == (2, 28) and not calendar.isleap(d.year):
+            occ[(2, 29)] = d.year
+    return occ
+
+
+def select_birthdays(db, dates: list[date], store_id: int | None = None) -> list[dict]:
+    """Aniversariantes das datas, com os canais já usados no ano da comemoração."""
+    occ = _occurrences(dates)
+    q = (
+        select(Client.id, Client.name, Client.email, Client.phone_wa, Client.store_id,
+               Client.birth_month, Client.birth_day, Store.name)
+        .join(Store, Store.id == Client.store_id, isouter=True)
+        # um par (mês, dia) por data: cada um é uma faixa do índice
+        .where(or_(*(and_(Client.birth_month == m, Client.birth_day == d) for m, d in sorted(occ))))
+        .order_by(Client.store_id, Client.birth_month, Client.birth_day, Client.id)
+    )
+    if store_id:
+        q = q.where(Client.store_id == store_id)
+    rows = [
+        {"client_id": cid, "name": name, "email": email, "phone_wa": phone_wa, "store_id": sid,
+         "store": store or "", "year": occ[(m, d)], "birthday": f"{d:02d}/{m:02d}", "sent": set()}
+        for cid, name, email, phone_wa, sid, m, d, store in db.execute(q)
+    ]
+    if rows:
+        by_id = {r["client_id"]: r for r in rows}
+        years = {r["year"] for r in rows}
+        for cid, year, channel in db.execute(
+            select(BirthdaySend.client_id, BirthdaySend.year, BirthdaySend.channel)
+            .where(BirthdaySend.client_id.in_(by_id), BirthdaySend.year.in_(years))
+        ):
+            if by_id[cid]["year"] == year:
+                by_id[cid]["sent"].add(channel)
+    return rows
+
+
+def whatsapp_url(row: dict) -> str | None:
+    if not row["phone_wa"]:
+        return None
+    return messages.ANIVERSARIO.url(row["phone_wa"], nome=messages.first_name(row["name"]), loja=row["store"])
+
+
+def run(db, today: date | None = None, days: int = 1, store_id: int | None = None,
+        dry_run: bool = False) -> dict:
+    """Enfileira os e-mails e gera os links de WhatsApp ainda não enviados. Não faz commit.
+
+    Devolve {"emails": n, "links": [{client_id, name, store, birthday, whatsapp_url}]}.
+    """
+    dates = window(today or datetime.utcnow().date(), days)
+    emails, links = 0, []
+    for row in select_birthdays(db, dates, store_id):
+        nome = messages.first_name(row["name"])
+        # sem SMTP o e-mail não sai nem fica marcado como enviado (entra quando configurarem)
+        if row["email"] and "email" not in row["sent"] and emailer.is_configured():
+            emails += 1
+            if not dry_run:
+                fields = {"nome": nome, "loja": row["store"]}
+                html = EMAIL_HTML.format(**{k: escape(v) for k, v in fields.items()})
+                outbox.enqueue_email(db, row["email"], EMAIL_SUBJECT.format(**fields),
+                                     EMAIL_TEXT.format(**fields), html)
+                db.add(BirthdaySend(client_id=row["client_id"], store_id=row["store_id"],
+                                    year=row["year"], channel="email"))
+        url = whatsapp_url(row) if "whatsapp" not in row["sent"] else None
+        if url:
+            links.append({"client_id": row["client_id"], "name": row["name"], "store_id": row["store_id"],
+                          "store": row["store"], "birthday": row["birthday"], "whatsapp_url": url})
+            if not dry_run:
+                db.add(BirthdaySend(client_id=row["client_id"], store_id=row["store_id"],
+                                    year=row["year"], channel="whatsapp"))
+    return {"dates": [d.isoformat() for d in dates], "emails": emails, "links": links}
@@ -0,0 +1,317 @@
+# campaigns.py — artes e links do WhatsApp em lote para campanhas
+# Seleciona o segmento (aniversariantes do mês, perto da meta, elegíveis, todos), renderiza
+# as artes num ProcessPoolExecutor (Pillow é CPU puro: um processo por núcleo) e
+# grava num .zip ou diretório conforme ficam prontas.
+# Pela API o lote roda em outro processo (manage render-cards --job); o andamento
+# fica num .json ao lado do .zip em CARD_BATCH_DIR, e qualquer worker da máquina responde.
+# Os links wa.me do segmento saem em streaming (CSV ou NDJSON), direto das colunas.
+import csv
+import fcntl
+import io
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from .models import Client, Store
+from .exports import YIELD_PER
+from . import imagegen, messages
+
+DEFAULT_META = int(os.getenv("DEFAULT_META", "10"))
+CARD_WORKERS = int(os.getenv("CARD_WORKERS", "0")) or os.cpu_count() or 1
+CARD_BATCH_DIR = os.getenv("CARD_BATCH_DIR") or os.path.join(tempfile.gettempdir(), "fidelidade_artes")
+CARD_BATCH_TTL = int(os.getenv("CARD_BATCH_TTL", str(24 * 3600)))  # lotes antigos são apagados
+# lotes simultâneos na máquina (cada um usa todos os núcleos); PROCESSANDO sem
+# atualização há CARD_JOB_STALE segundos conta como morto
+CARD_MAX_JOBS = int(os.getenv("CARD_MAX_JOBS", "1"))
+CARD_JOB_STALE = int(os.getenv("CARD_JOB_STALE", "900"))
+
+SEGMENTS = ("aniversariantes", "perto-da-meta", "elegiveis", "todos")
+EXTENSIONS = {"png": "png", "png-optimized": "png", "webp": "webp", "jpeg": "jpg"}
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ======================================================
+# SEGMENTOS
+# ======================================================
+
+def segment_query(segment: str, *columns, store_id: int | None = None, month: int | None = None,
+                  within: int = 2):
+    """SELECT só das `columns` (+ a meta da loja por último) para o segmento, em ordem de id.
+
+    aniversariantes  nascidos no mês `month` (padrão: atual)
+    perto-da-meta    ainda não atingiu a meta, mas faltam no máximo `within` visitas
+    elegiveis        saldo já alcança a meta (pode resgatar)
+    todos            todos os clientes (da loja, com store_id)
+    """
+    meta = func.coalesce(Store.meta_visitas, DEFAULT_META)
+    q = (
+        select(*columns, meta)
+        .join(Store, Store.id == Client.store_id, isouter=True)
+        .order_by(Client.id)
+    )
+    if segment == "aniversariantes":
+        q = q.where(Client.birth_month == (month or datetime.utcnow().month))
+    elif segment == "perto-da-meta":
+        q = q.where(Client.visits_balance < meta, Client.visits_balance >= meta - within)
+    elif segment == "elegiveis":
+        q = q.where(Client.visits_balance >= meta)
+    elif segment != "todos":
+        raise ValueError(f"segmento desconhecido: {segment}")
+    if store_id:
+        q = q.where(Client.store_id == store_id)
+    return q
+
+
+def select_clients(db, segment: str, store_id: int | None = None, month: int | None = None,
+                   within: int = 2) -> list[tuple]:
+    """Linhas (id, nome, saldo, meta) do segmento, em ordem de id."""
+    q = segment_query(segment, Client.id, Client.name, Client.visits_balance,
+                      store_id=store_id, month=month, within=within)
+    return [tuple(r) for r in db.execute(q)]
+
+
+# ======================================================
+# LINKS DE WHATSAPP EM MASSA
+# ======================================================
+
+LINK_TEMPLATES = {
+    "aniversariantes": messages.ANIVERSARIO,
+    "perto-da-meta": messages.PERTO_DA_META,
+    "elegiveis": messages.ELEGIVEL,
+    "todos": messages.REENGAJAMENTO,
+}
+LINK_HEADER = ["cliente_id", "nome", "loja", "whatsapp", "visitas", "meta", "link"]
+
+
+def iter_whatsapp_links(db, segment: str, store_id: int | None = None, month: int | None = None,
+                        within: int = 2):
+    """Linhas (id, nome, loja, phone_wa, visitas, meta, link) de quem tem WhatsApp no segmento.
+    Só colunas (sem objetos do ORM), em lotes de YIELD_PER."""
+    template = LINK_TEMPLATES[segment]
+    q = segment_query(segment, Client.id, Client.name, Store.name, Client.phone_wa, Client.visits_balance,
+                      store_id=store_id, month=month, within=within)
+    q = q.where(Client.phone_wa.is_not(None)).execution_options(yield_per=YIELD_PER)
+    first_name = messages.first_name
+    for cid, name, store, phone_wa, visitas, meta in db.execute(q):
+        visitas, meta = int(visitas or 0), int(meta)
+        link = template.url(phone_wa, nome=first_name(name), loja=store or "", visitas=visitas,
+                            meta=meta, faltam=max(0, meta - visitas))
+        yield cid, name, store or "", phone_wa, visitas, meta, link
+
+
+def stream_links_csv(db, segment: str, **filters):
+    """CSV em pedaços (';' e BOM, como as exportações)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+    buf.write("\ufeff")
+    writer.writerow(LINK_HEADER)
+    for i, row in enumerate(iter_whatsapp_links(db, segment, **filters), start=1):
+        writer.writerow(row)
+        if i % YIELD_PER == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def stream_links_ndjson(db, segment: str, **filters):
+    """Uma linha JSON por cliente (para o frontend ler conforme chega)."""
+    batch = []
+    for row in iter_whatsapp_links(db, segment, **filters):
+        batch.append(json.dumps(dict(zip(LINK_HEADER, row)), ensure_ascii=False))
+        if len(batch) == YIELD_PER:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+# ======================================================
+# RENDERIZAÇÃO
+# ======================================================
+
+def _render_one(job):
+    cid, name, visitas, meta, fmt = job
+    return cid, imagegen.make_card(name, visitas, meta, max(0, meta - visitas), fmt, cache=False)
+
+
+def render_batch(rows, out: str, fmt: str | None = None, workers: int | None = None,
+                 progress=None) -> int:
+    """Renderiza as artes de `rows` em `out` (.zip ou diretório). progress(feitas, total)."""
+    fmt = (fmt or imagegen.CARD_FORMAT).lower()
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"formato de arte desconhecido: {fmt}")
+    jobs = [(cid, name or "", int(saldo or 0), int(meta), fmt) for cid, name, saldo, meta in rows]
+    total = len(jobs)
+    workers = max(1, min(workers or CARD_WORKERS, total or 1))
+
+    if out.lower().endswith(".zip"):
+        # as imagens já vêm comprimidas: ZIP_STORED evita recomprimir à toa
+        archive = zipfile.ZipFile(out, "w", zipfile.ZIP_STORED)
+        write = archive.writestr
+    else:
+        archive = None
+        os.makedirs(out, exist_ok=True)
+
+        def write(name, data):
+            with open(os.path.join(out, name), "wb") as f:
+                f.write(data)
+
+    try:
+        if progress:
+            progress(0, total)
+        # spawn: processos limpos, sem herdar threads nem conexões do servidor
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            chunksize = max(1, min(64, total // (workers * 4)))
+            for done, (cid, data) in enumerate(pool.map(_render_one, jobs, chunksize=chunksize), start=1):
+                write(f"cliente_{cid}.{EXTENSIONS[fmt]}", data)
+                if progress:
+                    progress(done, total)
+    finally:
+        if archive:
+            archive.close()
+    return total
+
+
+# ======================================================
+# LOTES EM SEGUNDO PLANO (API)
+# ======================================================
+
+def _status_path(job_id: str) -> str:
+    return os.path.join(CARD_BATCH_DIR, f"{job_id}.json")
+
+
+def zip_path(job_id: str) -> str:
+    return os.path.join(CARD_BATCH_DIR, f"{job_id}.zip")
+
+
+def _write_status(job_id: str, **status) -> None:
+    tmp = _status_path(job_id) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"job_id": job_id, **status}, f)
+    os.replace(tmp, _status_path(job_id))
+
+
+def job_status(job_id: str) -> dict | None:
+    if not _JOB_ID.match(job_id or ""):
+        return None
+    try:
+        with open(_status_path(job_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class JobsBusy(RuntimeError):
+    pass
+
+
+def _running_jobs() -> int:
+    limit = time.time() - CARD_JOB_STALE
+    running = 0
+    for name in os.listdir(CARD_BATCH_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(CARD_BATCH_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                continue
+            with open(path) as f:
+                running += json.load(f).get("status") == "PROCESSANDO"
+        except (OSError, ValueError):
+            pass
+    return running
+
+
+def _prune() -> None:
+    limit = time.time() - CARD_BATCH_TTL
+    for name in os.listdir(CARD_BATCH_DIR):
+        path = os.path.join(CARD_BATCH_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def run_job(job_id: str, load_rows, fmt: str | None) -> int:
+    """Roda o lote gravando o andamento em CARD_BATCH_DIR/<job_id>.json.
+
+    load_rows() faz a consulta do segmento dentro do job, para que erro de banco
+    também apareça como FALHOU no status.
+    """
+    os.makedirs(CARD_BATCH_DIR, exist_ok=True)
+    rows = []
+    part = os.path.join(CARD_BATCH_DIR, f"{job_id}.part.zip")
+    last = [0.0]
+
+    def progress(done, total):
+        # no máximo ~2 escritas por segundo, mais a final
+        now = time.monotonic()
+        if done == total or now - last[0] >= 0.5:
+            last[0] = now
+            _write_status(job_id, status="PROCESSANDO", done=done, total=total)
+
+    try:
+        rows = load_rows()
+        total = render_batch(rows, part, fmt, progress=progress)
+        os.replace(part, zip_path(job_id))
+        _write_status(job_id, status="PRONTO", done=total, total=total)
+        return total
+    except Exception as e:
+        if os.path.exists(part):
+            os.remove(part)
+        _write_status(job_id, status="FALHOU", done=0, total=len(rows), error=str(e))
+        raise
+
+
+def start_job(segment: str, store_id: int | None = None, month: int | None = None,
+              within: int = 2, fmt: str | None = None) -> dict:
+    """Dispara `manage render-cards --job` num processo separado e devolve o status inicial.
+
+    Fica fora do worker web (gunicorn sync não pode segurar a requisição, e o pool
+    de processos não deve nascer de um processo com threads do servidor).
+    """
+    fmt = (fmt or imagegen.CARD_FORMAT).lower()
+    if segment not in SEGMENTS:
+        raise ValueError(f"segmento desconhecido: {segment}")
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"formato de arte desconhecido: {fmt}")
+    # tudo validado antes de gravar status: um 400 não pode deixar PROCESSANDO órfão
+    args = ["--segment", segment, "--within", str(int(within)), "--format", fmt]
+    if store_id:
+        args += ["--store", str(int(store_id))]
+    if month:
+        month = int(month)
+        if not 1 <= month <= 12:
+            raise ValueError(f"mês inválido: {month}")
+        args += ["--month", str(month)]
+    os.makedirs(CARD_BATCH_DIR, exist_ok=True)
+    _prune()
+    # trava de arquivo: dois workers não passam juntos pela contagem
+    with open(os.path.join(CARD_BATCH_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _running_jobs() >= CARD_MAX_JOBS:
+            raise JobsBusy("já há um lote de artes em andamento; tente quando terminar")
+        job_id = uuid.uuid4().hex
+        _write_status(job_id, status="PROCESSANDO", done=0, total=None)
+    cmd = [sys.executable, "-m", f"{__package__}.manage", "render-cards", *args, "--job", job_id]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        subprocess.Popen(cmd, cwd=root, stdout=subprocess.DEVNULL, start_new_session=True)
+    except OSError as e:
+        _write_status(job_id, status="FALHOU", done=0, total=None, error=str(e))
+        raise
+    return job_status(job_id)
@@ -1,20 +1,136 @@
 import os
+import time
+import threading
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session as SASession, sessionmaker, scoped_session, declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 DATABASE_SCHEMA = os.getenv("DATABASE_SCHEMA")
 
+# Pool (por processo). Dimensione DB_POOL_SIZE ~ threads por worker do gunicorn e
+# mantenha workers * (size + overflow) abaixo do max_connections do Postgres.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Postgres gerenciado derruba conexões ociosas: recicla antes disso e testa no checkout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sem limite
+
 connect_args = {}
+options = []
 if DATABASE_SCHEMA:
     # Define o search_path no Postgres para criar/usar as tabelas nesse schema
-    connect_args = {"options": f"-csearch_path={DATABASE_SCHEMA}"}
+    options.append(f"-csearch_path={DATABASE_SCHEMA}")
+if DB_STATEMENT_TIMEOUT_MS:
+    options.append(f"-cstatement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+if options:
+    connect_args = {"options": " ".join(options)}
 
 if not DATABASE_URL:
     # fallback local em SQLite
     DATABASE_URL = "sqlite:///db.sqlite3"
     connect_args = {}
 
-engine = create_engine(DATABASE_URL, future=True, echo=False, connect_args=connect_args)
-SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True))
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mede quantos checkouts houve e quanto tempo se esperou por conexão."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # dispose()/recreate() não pode perder os contadores
+        new = super().recreate()
+        new.checkouts, new.timeouts = self.checkouts, self.timeouts
+        new.wait_total, new.wait_max = self.wait_total, self.wait_max
+        return new
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "checked_out": self.checkedout(),
+                "overflow": max(0, self.overflow()),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_total * 1000, 1),
+                "wait_ms_max": round(self.wait_max * 1000, 1),
+            }
+
+
+def _engine_kwargs(url: str) -> dict:
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return {}  # SQLite em memória usa o pool próprio do dialeto
+    return {
+        "poolclass": MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, future=True, echo=False, connect_args=connect_args,
+                       **_engine_kwargs(DATABASE_URL))
+
+# Réplica de leitura opcional (mesmo schema/opções); sem DATABASE_READ_URL tudo vai no primário
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+read_engine = (
+    create_engine(DATABASE_READ_URL, future=True, echo=False, connect_args=connect_args,
+                  **_engine_kwargs(DATABASE_READ_URL))
+    if DATABASE_READ_URL
+    else engine
+)
+
+
+class RoutingSession(SASession):
+    """Sessão que lê da réplica quando info["replica"] está ligado; flush vai sempre ao primário."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("replica") and not self._flushing:
+            return read_engine
+        return engine
+
+
+# Session: fábrica "solta" (streaming, threads, scripts); SessionLocal: uma sessão por
+# thread/requisição, removida no teardown do Flask (main.py) — handlers não fecham.
+Session = sessionmaker(class_=RoutingSession, autoflush=False, autocommit=False, future=True)
+SessionLocal = scoped_session(Session)
 Base = declarative_base()
+
+
+def _stats(e) -> dict:
+    pool = e.pool
+    return pool.stats() if isinstance(pool, MeteredQueuePool) else {"status": pool.status()}
+
+
+def pool_stats() -> dict:
+    stats = _stats(engine)
+    if read_engine is not engine:
+        stats["replica"] = _stats(read_engine)
+    return stats
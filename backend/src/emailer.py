@@ -1,6 +1,9 @@
-import os, smtplib, ssl
+import os, smtplib, ssl, threading, time, queue
+from contextlib import contextmanager
 from email.message import EmailMessage
 
+from . import metrics
+
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
@@ -10,9 +13,20 @@ SMTP_SSLF = os.getenv("SMTP_SSL", "false").lower() == "true"  # novo: suporta SS
 FROM_NAME = os.getenv("SMTP_FROM_NAME", "Casa do Cigano")
 FROM_MAIL = os.getenv("SMTP_FROM_EMAIL", SMTP_USER or "no-reply@example.com")
 
-def send_email(to_email: str, subject: str, text: str, html: str | None = None) -> bool:
-    if not (SMTP_HOST and SMTP_USER and SMTP_PASS and to_email):
-        return False  # SMTP não configurado
+# pool de conexões autenticadas (uma negociação TLS+login por lote, não por mensagem)
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))         # conexões ociosas mantidas
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))  # reabre se ficou parada mais que isso
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# envios/s POR PROCESSO (0 = sem limite). Para respeitar o limite do provedor, drene o
+# outbox num único processo (EMAIL_WORKERS=0 no web + `manage outbox-worker`)
+SMTP_RATE_PER_SEC = float(os.getenv("SMTP_RATE_PER_SEC", "0"))
+
+def is_configured() -> bool:
+    # usuário/senha são opcionais (ex.: servidor SMTP local de testes, como aiosmtpd)
+    return bool(SMTP_HOST)
+
+
+def build_message(to_email: str, subject: str, text: str, html: str | None = None) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
     msg["From"] = f"{FROM_NAME} <{FROM_MAIL}>"
@@ -20,21 +34,185 @@ def send_email(to_email: str, subject: str, text: str, html: str | None = None)
     msg.set_content(text)
     if html:
         msg.add_alternative(html, subtype="html")
+    return msg
 
-    try:
-        # Se SMTP_SSL=true OU porta 465, usar SSL direto
-        if SMTP_SSLF or SMTP_PORT == 465:
+
+def _connect() -> smtplib.SMTP:
+    metrics.smtp_connects.inc()
+    # Se SMTP_SSL=true OU porta 465, usar SSL direto
+    if SMTP_SSLF or SMTP_PORT == 465:
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_TLS:
             context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context) as server:
-                server.login(SMTP_USER, SMTP_PASS)
-                server.send_message(msg)
-        else:
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                if SMTP_TLS:
-                    context = ssl.create_default_context()
-                    server.starttls(context=context)
-                server.login(SMTP_USER, SMTP_PASS)
-                server.send_message(msg)
+            server.starttls(context=context)
+    try:
+        if SMTP_USER and SMTP_PASS:
+            server.login(SMTP_USER, SMTP_PASS)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class RateLimiter:
+    """Token bucket compartilhado por todas as conexões do processo (não entre processos)."""
+
+    def __init__(self, per_second: float, burst: float | None = None):
+        self.per_second = per_second
+        self.capacity = burst or max(1.0, per_second)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.per_second <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.per_second)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.per_second
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(SMTP_RATE_PER_SEC)
+
+
+class SMTPSession:
+    """Conexão SMTP autenticada e reaproveitável.
+
+    Reconecta sozinha quando o servidor derruba a conexão (SMTPServerDisconnected)
+    ou quando ficou ociosa por mais de SMTP_IDLE_SECONDS.
+    """
+
+    def __init__(self):
+        self._server: smtplib.SMTP | None = None
+        self._last_used = 0.0
+
+    def _ensure(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+            self.close()
+        if self._server is None:
+            self._server = _connect()
+        return self._server
+
+    def send(self, msg: EmailMessage) -> None:
+        """Envia uma mensagem; levanta exceção se falhar mesmo após reconectar."""
+        rate_limiter.acquire()
+        try:
+            with metrics.smtp_send_seconds.time():
+                self._send(msg)
+        except Exception as e:
+            metrics.smtp_failures.inc(error=type(e).__name__)
+            raise
+
+    def _send(self, msg: EmailMessage) -> None:
+        try:
+            try:
+                self._ensure().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                self._ensure().send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise  # o servidor respondeu; a conexão continua utilizável
+        except OSError:
+            self.close()  # socket em estado desconhecido: reabre no próximo envio
+            raise
+        self._last_used = time.monotonic()
+
+    def send_many(self, messages) -> list[Exception | None]:
+        """Envia várias mensagens na mesma conexão. Retorna o erro de cada uma (None = ok)."""
+        results = []
+        for msg in messages:
+            try:
+                self.send(msg)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SMTPPool:
+    """Mantém até `size` sessões ociosas para reaproveitar entre lotes/threads."""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self._idle: queue.LifoQueue[SMTPSession] = queue.LifoQueue(maxsize=max(0, size))
+
+    @contextmanager
+    def session(self):
+        try:
+            s = self._idle.get_nowait()
+        except queue.Empty:
+            s = SMTPSession()
+        try:
+            yield s
+        except Exception:
+            s.close()
+            raise
+        if not s.connected:
+            return
+        try:
+            self._idle.put_nowait(s)
+        except queue.Full:
+            s.close()
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = SMTPPool()
+
+
+def deliver(msg: EmailMessage) -> None:
+    """Envia a mensagem; levanta exceção em caso de falha (usado pelo outbox)."""
+    with pool.session() as s:
+        s.send(msg)
+
+
+def send_many(messages) -> list[Exception | None]:
+    """Envia um lote (campanhas, outbox) com um único handshake TLS+login."""
+    with pool.session() as s:
+        return s.send_many(messages)
+
+
+def send_email(to_email: str, subject: str, text: str, html: str | None = None) -> bool:
+    if not (is_configured() and to_email):
+        return False  # SMTP não configurado
+    try:
+        deliver(build_message(to_email, subject, text, html))
         return True
     except Exception as e:
         print("EMAIL ERROR:", e)
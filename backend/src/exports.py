@@ -0,0 +1,121 @@
+# exports.py — exportação de clientes, visitas e resgates (CSV ou XLSX)
+# As linhas vêm do banco com yield_per (cursor no servidor no Postgres) e são
+# escritas conforme chegam: o CSV sai em streaming na resposta e o XLSX usa o modo
+# write_only do openpyxl gravando num arquivo temporário, então a memória não
+# cresce com o número de linhas.
+import csv
+import io
+import tempfile
+from datetime import datetime, date
+
+from sqlalchemy import select
+
+from .models import Client, Store, Visit, Redemption
+
+YIELD_PER = 1000
+
+
+def _clients_query(store_id, since, until):
+    q = (
+        select(
+            Client.id, Client.name, Client.cpf, Client.phone, Client.email, Client.birthday,
+            Store.name, Client.visits_balance, Client.lifetime_visits, Client.created_at,
+        )
+        .join(Store, Store.id == Client.store_id, isouter=True)
+        .order_by(Client.id)
+    )
+    if store_id:
+        q = q.where(Client.store_id == store_id)
+    if since:
+        q = q.where(Client.created_at >= since)
+    if until:
+        q = q.where(Client.created_at < until)
+    return q
+
+
+def _visits_query(store_id, since, until):
+    q = (
+        select(Visit.id, Visit.created_at, Client.name, Client.cpf, Store.name)
+        .join(Client, Client.id == Visit.client_id)
+        .join(Store, Store.id == Visit.store_id, isouter=True)
+        .order_by(Visit.id)
+    )
+    if store_id:
+        q = q.where(Visit.store_id == store_id)
+    if since:
+        q = q.where(Visit.created_at >= since)
+    if until:
+        q = q.where(Visit.created_at < until)
+    return q
+
+
+def _redemptions_query(store_id, since, until):
+    q = (
+        select(Redemption.id, Redemption.created_at, Client.name, Client.cpf, Store.name, Redemption.gift_name)
+        .join(Client, Client.id == Redemption.client_id)
+        .join(Store, Store.id == Redemption.store_id, isouter=True)
+        .order_by(Redemption.id)
+    )
+    if store_id:
+        q = q.where(Redemption.store_id == store_id)
+    if since:
+        q = q.where(Redemption.created_at >= since)
+    if until:
+        q = q.where(Redemption.created_at < until)
+    return q
+
+
+DATASETS = {
+    "clientes": (
+        ["ID", "Nome", "CPF", "Telefone", "Email", "Nascimento", "Loja", "Saldo de visitas",
+         "Visitas (total)", "Cadastro"],
+        _clients_query,
+    ),
+    "visitas": (["ID", "Data", "Cliente", "CPF", "Loja"], _visits_query),
+    "resgates": (["ID", "Data", "Cliente", "CPF", "Loja", "Brinde"], _redemptions_query),
+}
+
+
+def _cell(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat(sep=" ") if isinstance(v, datetime) else v.isoformat()
+    return v
+
+
+def iter_rows(db, dataset: str, store_id=None, since=None, until=None):
+    _, build = DATASETS[dataset]
+    result = db.execute(build(store_id, since, until).execution_options(yield_per=YIELD_PER))
+    for row in result:
+        yield row
+
+
+def stream_csv(db, dataset: str, **filters):
+    """Gera o CSV em pedaços (separador ';' e BOM, para abrir direto no Excel)."""
+    header, _ = DATASETS[dataset]
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+    buf.write("\ufeff")
+    writer.writerow(header)
+    for i, row in enumerate(iter_rows(db, dataset, **filters), start=1):
+        writer.writerow([_cell(v) if v is not None else "" for v in row])
+        if i % YIELD_PER == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def write_xlsx(db, dataset: str, **filters):
+    """Grava o XLSX (write_only) num arquivo temporário e devolve o arquivo aberto."""
+    from openpyxl import Workbook
+
+    header, _ = DATASETS[dataset]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(dataset.capitalize())
+    ws.append(header)
+    for row in iter_rows(db, dataset, **filters):
+        ws.append([_cell(v) for v in row])
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
@@ -0,0 +1,51 @@
+# harness.py — preparo comum das CLIs de checagem (planscheck, stresscheck, bench)
+# Banco descartável, seed, massa sintética e login pelo test client do Flask.
+# As variáveis de ambiente precisam estar definidas antes de importar .db/.main:
+# chame use_disposable_db() primeiro; as demais funções só importam o app por dentro.
+import os
+import tempfile
+
+PASSWORD = "123456"  # senha dos usuários criados pelo seed
+
+
+def add_database_arg(parser) -> None:
+    parser.add_argument("--database-url", help="banco DESCARTÁVEL (padrão: SQLite temporário)")
+
+
+def use_disposable_db(database_url: str | None, name: str, **env: str) -> None:
+    """Aponta DATABASE_URL para `database_url` ou um SQLite temporário e aplica `env`."""
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{tempfile.mkdtemp()}/{name}.sqlite3"
+    os.environ.setdefault("EMAIL_WORKERS", "0")
+    os.environ.update(env)
+
+
+def seeded_client():
+    """(app, test client) com as lojas e usuários do seed."""
+    import warnings
+
+    warnings.filterwarnings("ignore")
+    from .main import app
+
+    http = app.test_client()
+    http.post("/api/_setup/seed")
+    return app, http
+
+
+def populate(clients: int, visits: int, seed: int = 42, log=print) -> None:
+    """Massa sintética (synthetic.populate) seguida de ANALYZE para o planejador."""
+    from sqlalchemy import text
+    from .db import engine, SessionLocal
+    from . import synthetic
+
+    db = SessionLocal()
+    try:
+        synthetic.populate(db, clients=clients, visits=visits, seed=seed, log=log)
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def auth_headers(http, email: str, password: str = PASSWORD) -> dict:
+    tok = http.post("/api/auth/login", json={"email": email, "password": password}).json["token"]
+    return {"Authorization": "Bearer " + tok}
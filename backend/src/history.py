@@ -0,0 +1,171 @@
+# history.py — histórico do cliente (resumo, extrato e arquivamento de ciclos)
+# O resumo sai de agregados (COUNT/MAX por loja) pelos índices do cliente, sem carregar
+# Client.visits/redemptions. O extrato junta visitas e resgates em ordem decrescente,
+# paginado por cursor (created_at, tipo, id): cada ramo lê só per_page+1 linhas pelo
+# índice (client_id, created_at) e a junção é feita aqui. Cada visita mostra o resgate
+# que a consumiu, o que responde o "para onde foram meus pontos".
+#
+# Ciclos antigos (resgates com mais de N dias) podem ser compactados em archived_cycles:
+# uma linha por (resgate, loja) com a contagem e o período das visitas, que saem de visits.
+#
+#   python -m src.manage archive-cycles --older-than-days 365
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, func, or_, and_
+
+from .models import Visit, Redemption, ArchivedCycle
+from . import stores
+from .pagination import encode_cursor, decode_cursor
+
+KIND_RANK = {"resgate": 1, "visita": 0}  # no mesmo instante, o resgate aparece antes
+
+
+def _iso(v):
+    return v.isoformat() if v else None
+
+
+def summary(db, client, meta: int) -> dict:
+    """Totais por loja (visitas ativas + arquivadas), resgates e o ciclo atual."""
+    per_store: dict = {}
+    live = db.execute(
+        select(Visit.store_id, func.count(Visit.id), func.min(Visit.created_at), func.max(Visit.created_at))
+        .where(Visit.client_id == client.id)
+        .group_by(Visit.store_id)
+    )
+    archived = db.execute(
+        select(ArchivedCycle.store_id, func.sum(ArchivedCycle.visits),
+               func.min(ArchivedCycle.first_visit_at), func.max(ArchivedCycle.last_visit_at))
+        .where(ArchivedCycle.client_id == client.id)
+        .group_by(ArchivedCycle.store_id)
+    )
+    for rows in (live, archived):
+        for sid, n, first, last in rows:
+            st = per_store.setdefault(sid, {"store_id": sid, "visits": 0, "first_visit_at": None,
+                                            "last_visit_at": None})
+            st["visits"] += int(n or 0)
+            st["first_visit_at"] = min(filter(None, (st["first_visit_at"], first)), default=None)
+            st["last_visit_at"] = max(filter(None, (st["last_visit_at"], last)), default=None)
+    names = {st.id: st.name for st in stores.registry.all(db)}
+
+    redemptions, last_redemption = db.execute(
+        select(func.count(Redemption.id), func.max(Redemption.created_at)).where(Redemption.client_id == client.id)
+    ).one()
+    cycle_started = db.execute(
+        select(func.min(Visit.created_at)).where(Visit.client_id == client.id, Visit.redemption_id.is_(None))
+    ).scalar()
+
+    balance = int(client.visits_balance or 0)
+    return {
+        "client": {"id": client.id, "name": client.name, "cpf": client.cpf, "store_id": client.store_id},
+        "lifetime_visits": int(client.lifetime_visits or 0),
+        "visits_by_store": [
+            {**st, "store": names.get(st["store_id"]), "first_visit_at": _iso(st["first_visit_at"]),
+             "last_visit_at": _iso(st["last_visit_at"])}
+            for st in sorted(per_store.values(), key=lambda s: -s["visits"])
+        ],
+        "redemptions": int(redemptions or 0),
+        "last_redemption_at": _iso(last_redemption),
+        "cycle": {
+            "visits": balance,
+            "meta": int(meta),
+            "faltam": max(0, int(meta) - balance),
+            "eligible": balance >= meta,
+            "started_at": _iso(cycle_started),
+        },
+    }
+
+
+def _before(model, kind: str, cursor):
+    """Linhas deste ramo depois do cursor na ordem (created_at, tipo, id) decrescente."""
+    at, cursor_kind, cursor_id = cursor
+    rank, cursor_rank = KIND_RANK[kind], KIND_RANK.get(cursor_kind, 0)
+    if rank < cursor_rank:  # no mesmo instante, este tipo vem depois do cursor
+        return model.created_at <= at
+    if rank > cursor_rank:
+        return model.created_at < at
+    return or_(model.created_at < at, and_(model.created_at == at, model.id < cursor_id))
+
+
+def ledger(db, client_id: int, per_page: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """Página do extrato (visitas e resgates) e o cursor da próxima (None = acabou)."""
+    after = decode_cursor(cursor, datetime, str, int) if cursor else None
+    branches = (
+        ("visita", Visit, select(Visit.id, Visit.created_at, Visit.store_id, Visit.redemption_id)),
+        ("resgate", Redemption, select(Redemption.id, Redemption.created_at, Redemption.store_id,
+                                       Redemption.gift_name)),
+    )
+    rows = []
+    for kind, model, q in branches:
+        q = q.where(model.client_id == client_id)
+        if after:
+            q = q.where(_before(model, kind, after))
+        q = q.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1)
+        for r in db.execute(q):
+            item = {"type": kind, "id": r[0], "at": r[1], "store_id": r[2]}
+            if kind == "visita":
+                item["redemption_id"] = r[3]  # NULL = ainda conta no saldo
+            else:
+                item["gift_name"] = r[3]
+            rows.append(item)
+    rows.sort(key=lambda i: (i["at"], KIND_RANK[i["type"]], i["id"]), reverse=True)
+    page = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = page[-1]
+        next_cursor = encode_cursor(last["at"], last["type"], last["id"])
+    # quantas visitas cada resgate da página consumiu (ativas + arquivadas)
+    rids = [i["id"] for i in page if i["type"] == "resgate"]
+    if rids:
+        consumed = dict(db.execute(
+            select(Visit.redemption_id, func.count(Visit.id)).where(Visit.redemption_id.in_(rids))
+            .group_by(Visit.redemption_id)
+        ).all())
+        for rid, n in db.execute(
+            select(ArchivedCycle.redemption_id, func.sum(ArchivedCycle.visits))
+            .where(ArchivedCycle.redemption_id.in_(rids)).group_by(ArchivedCycle.redemption_id)
+        ):
+            consumed[rid] = consumed.get(rid, 0) + int(n)
+    for item in page:
+        item["at"] = _iso(item["at"])
+        if item["type"] == "resgate":
+            item["visits_consumed"] = consumed.get(item["id"], 0)
+    return page, next_cursor
+
+
+def archive_cycles(db, older_than_days: int, batch: int = 500, dry_run: bool = False, log=None) -> dict:
+    """Compacta as visitas de resgates mais antigos que `older_than_days` em archived_cycles.
+    Faz commit por lote (é um comando de manutenção)."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    last_id, cycles, visits = 0, 0, 0
+    while True:
+        ids = list(db.execute(
+            select(Redemption.id)
+            .where(Redemption.id > last_id, Redemption.created_at < cutoff)
+            .order_by(Redemption.id)
+            .limit(batch)
+        ).scalars())
+        if not ids:
+            break
+        last_id = ids[-1]
+        grouped = (
+            select(Visit.redemption_id, Visit.store_id, func.min(Visit.client_id), func.count(Visit.id),
+                   func.min(Visit.created_at), func.max(Visit.created_at))
+            .where(Visit.redemption_id.in_(ids))
+            .group_by(Visit.redemption_id, Visit.store_id)
+        )
+        rows = db.execute(grouped).all()
+        if not rows:
+            continue
+        cycles += len({r[0] for r in rows})
+        visits += sum(r[3] for r in rows)
+        if not dry_run:
+            db.execute(insert(ArchivedCycle), [
+                {"redemption_id": rid, "store_id": sid, "client_id": cid, "visits": n,
+                 "first_visit_at": first, "last_visit_at": last}
+                for rid, sid, cid, n, first, last in rows
+            ])
+            db.execute(delete(Visit).where(Visit.redemption_id.in_(ids)).execution_options(synchronize_session=False))
+            db.commit()
+        if log:
+            log(f"resgates até id {last_id}: {cycles} ciclo(s), {visits} visita(s)")
+    return {"cycles": cycles, "visits": visits}
@@ -0,0 +1,77 @@
+# idempotency.py — header Idempotency-Key para POSTs que não podem repetir
+# A resposta é gravada em idempotency_keys na MESMA transação da escrita: ou as duas
+# coisas ficam, ou nenhuma. Repetições com a mesma chave recebem a resposta original.
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from flask import Response
+from sqlalchemy import select, delete
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+KEY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+MAX_KEY_LEN = 128
+
+
+def key_from(request) -> str | None:
+    key = (request.headers.get(HEADER) or "").strip()
+    return key[:MAX_KEY_LEN] or None
+
+
+def fingerprint(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def lookup(db, user_id: int, key: str) -> IdempotencyKey | None:
+    return db.execute(
+        select(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.created_at >= datetime.utcnow() - KEY_TTL,
+        )
+    ).scalar_one_or_none()
+
+
+def replay(saved: IdempotencyKey, fp: str) -> Response:
+    """Resposta original; 409 se a chave foi reutilizada com outro corpo."""
+    if saved.fingerprint != fp:
+        return Response(
+            json.dumps({"error": f"{HEADER} já usada com outros dados"}),
+            status=409,
+            mimetype="application/json",
+        )
+    return Response(
+        saved.response_body,
+        status=saved.status_code,
+        mimetype="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def save(db, user_id: int, key: str, endpoint: str, fp: str, body: dict, status: int = 200) -> None:
+    """Grava a resposta junto da escrita. Não faz commit (chave repetida estoura no commit)."""
+    # a mesma chave vencida ainda ocupa o índice único
+    db.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.created_at < datetime.utcnow() - KEY_TTL,
+    ))
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        fingerprint=fp,
+        status_code=status,
+        response_body=json.dumps(body, default=str),
+    ))
+
+
+def prune(db) -> int:
+    """Apaga chaves vencidas. Não faz commit."""
+    res = db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - KEY_TTL)
+    )
+    return res.rowcount or 0
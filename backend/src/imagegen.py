@@ -1,14 +1,48 @@
-# imagegen.py — gera arte padrão personalizada para WhatsApp (PNG)
+# imagegen.py — gera arte padrão personalizada para WhatsApp (PNG/WebP/JPEG)
+# O fundo (faixas, logo, título, rodapé e borda) é desenhado uma vez e reaproveitado;
+# por cliente só o texto variável é composto por cima. Fontes e logo redimensionado
+# ficam em cache no módulo e os bytes prontos num LRU pequeno por (nome, visitas, meta),
+# limitado em entradas e em bytes. Os lotes (campaigns.render_batch) não usam o LRU:
+# cada cliente sai uma vez só e o cache só ocuparia memória nos processos filhos.
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 
+from . import metrics
+
 # Cores da CDC
 VINHO = (104, 0, 38)     # #680026
 DOURADO = (214, 167, 46) # #D6A72E
 CREME = (250, 245, 235)  # #FAF5EB
 CHUMBO = (33, 33, 33)
 
+W, H = 1080, 1080  # quadrado padrão feed/whatsapp
+TITLE = "Programa de Fidelidade"
+FOOTER = "Casa do Cigano • Obrigado pela visita!"
+
+# CARD_FORMAT: png (rápido, sem optimize), png-optimized (menor, bem mais lento), webp, jpeg
+CARD_FORMAT = os.getenv("CARD_FORMAT", "png").lower()
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "64"))  # 0 = sem cache
+CARD_CACHE_BYTES = int(os.getenv("CARD_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+MIMETYPES = {
+    "png": "image/png",
+    "png-optimized": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+_SAVE_ARGS = {
+    "png": ("PNG", {"compress_level": 1}),
+    "png-optimized": ("PNG", {"optimize": True}),
+    "webp": ("WEBP", {"quality": 85, "method": 2}),
+    "jpeg": ("JPEG", {"quality": 88}),
+}
+
+
+@lru_cache(maxsize=None)
 def _load_font(size=64):
     # tenta fontes comuns; fallback para default
     try:
@@ -19,56 +53,107 @@ def _load_font(size=64):
         # Windows: Arial
         return ImageFont.truetype("arial.ttf", size)
     except Exception:
-        return ImageFont.load_default()
+        return ImageFont.load_default(size)
 
-def _load_logo():
-    # Logo opcional: BACKEND_LOGO_PATH no .env
+
+@lru_cache(maxsize=1)
+def _load_logo(max_h=220):
+    # Logo opcional: BACKEND_LOGO_PATH no .env (já redimensionado para caber no topo)
     logo_path = os.getenv("BACKEND_LOGO_PATH")
     if logo_path and os.path.exists(logo_path):
         try:
-            return Image.open(logo_path).convert("RGBA")
+            logo = Image.open(logo_path).convert("RGBA")
+            ratio = max_h / logo.height
+            return logo.resize((int(logo.width * ratio), int(logo.height * ratio)))
         except Exception:
             pass
     return None
 
-def make_card(cliente_nome: str, visitas: int, meta: int, faltam: int):
-    W, H = 1080, 1080  # quadrado padrão feed/whatsapp
+
+@lru_cache(maxsize=1)
+def _background():
+    """Parte fixa da arte; nunca desenhe nela direto (use .copy())."""
     img = Image.new("RGB", (W, H), CREME)
     draw = ImageDraw.Draw(img)
 
     # topo vinho
-    draw.rectangle([0,0,W,360], fill=VINHO)
+    draw.rectangle([0, 0, W, 360], fill=VINHO)
 
     # linhas douradas decorativas
-    draw.rectangle([0,340,W,360], fill=DOURADO)
+    draw.rectangle([0, 340, W, 360], fill=DOURADO)
 
     # logo (se houver)
     logo = _load_logo()
     if logo:
-        # redimensiona para caber no topo
-        max_h = 220
-        ratio = max_h / logo.height
-        logo2 = logo.resize((int(logo.width*ratio), int(logo.height*ratio)))
-        img.paste(logo2, (60, 60), logo2)
+        img.paste(logo, (60, 60), logo)
 
-    # textos
+    # Título topo (à direita do logo)
     title_font = _load_font(78)
-    name_font = _load_font(64)
-    big_font = _load_font(120)
+    left, _, right, _ = draw.textbbox((0, 0), TITLE, font=title_font)
+    draw.text((W - 60 - (right - left), 80), TITLE, font=title_font, fill=(255, 255, 255))
+
+    # rodapé
     small_font = _load_font(44)
+    left, top, right, bottom = draw.textbbox((0, 0), FOOTER, font=small_font)
+    draw.text(((W - (right - left)) // 2, 980 - (bottom - top)), FOOTER, font=small_font, fill=CHUMBO)
 
-    # Título topo (à direita do logo)
-    title = "Programa de Fidelidade"
-    tw, th = draw.textsize(title, font=title_font)
-    draw.text((W-60-tw, 80), title, font=title_font, fill=(255,255,255))
+    # borda fina
+    draw.rectangle([5, 5, W - 5, H - 5], outline=VINHO, width=6)
+    return img
+
+
+class _BytesLRU:
+    """LRU de bytes limitado por número de entradas e pelo total de bytes."""
+
+    def __init__(self, max_items: int, max_bytes: int):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self._size = 0
+        self._data: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def put(self, key, data: bytes) -> None:
+        if self.max_items <= 0 or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = data
+            self._size += len(data)
+            while len(self._data) > self.max_items or self._size > self.max_bytes:
+                _, dropped = self._data.popitem(last=False)
+                self._size -= len(dropped)
+
+
+_cache = _BytesLRU(CARD_CACHE_SIZE, CARD_CACHE_BYTES)
+
+
+def _render(primeiro_nome: str, visitas: int, meta: int, faltam: int, fmt: str) -> bytes:
+    with metrics.card_render_seconds.time(format=fmt):
+        return _draw(primeiro_nome, visitas, meta, faltam, fmt)
+
+
+def _draw(primeiro_nome: str, visitas: int, meta: int, faltam: int, fmt: str) -> bytes:
+    img = _background().copy()
+    draw = ImageDraw.Draw(img)
+    name_font = _load_font(64)
+    big_font = _load_font(120)
 
     # saudação
-    hello = f"Olá, {cliente_nome.split()[0]}!"
-    draw.text((60, 420), hello, font=name_font, fill=CHUMBO)
+    draw.text((60, 420), f"Olá, {primeiro_nome}!", font=name_font, fill=CHUMBO)
 
     # pontuação
-    pontos = f"Você tem {visitas} visita(s)"
-    draw.text((60, 520), pontos, font=big_font, fill=VINHO)
+    draw.text((60, 520), f"Você tem {visitas} visita(s)", font=big_font, fill=VINHO)
 
     # meta/ faltam
     if faltam <= 0:
@@ -80,16 +165,30 @@ def make_card(cliente_nome: str, visitas: int, meta: int, faltam: int):
     draw.text((60, 670), f"Meta: {meta} visitas", font=name_font, fill=CHUMBO)
     draw.text((60, 760), frase, font=name_font, fill=fillc)
 
-    # rodapé
-    footer = "Casa do Cigano • Obrigado pela visita!"
-    fw, fh = draw.textsize(footer, font=small_font)
-    draw.text(((W-fw)//2, 980-fh), footer, font=small_font, fill=CHUMBO)
-
-    # borda fina
-    draw.rectangle([5,5,W-5,H-5], outline=VINHO, width=6)
-
-    # retorna bytes PNG
+    kind, opts = _SAVE_ARGS[fmt]
     buf = BytesIO()
-    img.save(buf, format="PNG", optimize=True)
-    buf.seek(0)
+    img.save(buf, format=kind, **opts)
     return buf.getvalue()
+
+
+def make_card(cliente_nome: str, visitas: int, meta: int, faltam: int, fmt: str | None = None,
+              cache: bool = True) -> bytes:
+    """Bytes da arte no formato `fmt` (padrão CARD_FORMAT; veja MIMETYPES).
+
+    cache=False renderiza sem consultar nem guardar no LRU (lotes)."""
+    fmt = (fmt or CARD_FORMAT).lower()
+    if fmt not in _SAVE_ARGS:
+        raise ValueError(f"formato de arte desconhecido: {fmt}")
+    primeiro_nome = (cliente_nome or "").split()[0] if (cliente_nome or "").strip() else ""
+    key = (primeiro_nome, int(visitas), int(meta), int(faltam), fmt)
+    if not cache:
+        return _render(*key)
+    data = _cache.get(key)
+    if data is None:
+        data = _render(*key)
+        _cache.put(key, data)
+    return data
+
+
+def cache_hits() -> int:
+    return _cache.hits
@@ -0,0 +1,250 @@
+# importer.py — importação em lote de clientes (CSV ou XLSX)
+# Lê o arquivo linha a linha (csv.reader / openpyxl read_only), normaliza CPF e
+# telefone, descarta CPFs já cadastrados com uma consulta IN por lote e insere
+# com executemany (insertmanyvalues no Postgres), um commit por lote.
+import csv
+import io
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+
+from .models import Client, Store
+from .util import only_digits, format_phone_to_wa
+from . import rollups
+
+CHUNK_SIZE = 1000
+MAX_REPORTED = 1000  # linhas de erro/aviso devolvidas no relatório
+
+# cabeçalhos aceitos -> campo
+HEADERS = {
+    "nome": "name", "name": "name", "cliente": "name",
+    "cpf": "cpf",
+    "telefone": "phone", "phone": "phone", "celular": "phone", "whatsapp": "phone", "fone": "phone",
+    "email": "email", "e-mail": "email",
+    "nascimento": "birthday", "data_nascimento": "birthday", "aniversario": "birthday",
+    "aniversário": "birthday", "birthday": "birthday", "data de nascimento": "birthday",
+    "loja": "store", "store": "store", "store_id": "store",
+}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+# ======================================================
+# LEITURA
+# ======================================================
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def iter_records(stream, filename: str):
+    """Gera (número da linha, dict campo->valor) a partir do arquivo enviado."""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        rows = _iter_xlsx(stream)
+    elif name.endswith((".csv", ".txt")):
+        rows = _iter_csv(stream)
+    else:
+        raise ImportFormatError("formato não suportado (use .csv ou .xlsx)")
+    header = next(rows, None)
+    if not header:
+        raise ImportFormatError("arquivo vazio")
+    fields = [HEADERS.get(str(h or "").strip().lower()) for h in header]
+    if "name" not in fields or "cpf" not in fields:
+        raise ImportFormatError("cabeçalho precisa ter as colunas nome e cpf")
+    for lineno, row in enumerate(rows, start=2):
+        rec = {f: v for f, v in zip(fields, row) if f}
+        if any(v not in (None, "") for v in rec.values()):
+            yield lineno, rec
+
+
+# ======================================================
+# NORMALIZAÇÃO
+# ======================================================
+
+def _parse_date(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    s = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"data de nascimento inválida: {s}")
+
+
+def normalize(rec: dict, stores: dict, default_store_id: int | None) -> tuple[dict, list[str]]:
+    """Devolve (linha pronta para insert, avisos). Levanta ValueError se a linha for inválida."""
+    warnings = []
+    name = " ".join(str(rec.get("name") or "").split())
+    if not name:
+        raise ValueError("nome vazio")
+    raw_cpf = rec.get("cpf")
+    if isinstance(raw_cpf, (int, float)) and not isinstance(raw_cpf, bool):
+        # célula numérica do XLSX perde o zero à esquerda
+        cpf = f"{int(raw_cpf):011d}"
+    else:
+        cpf = only_digits(str(raw_cpf or ""))
+    if len(cpf) != 11:
+        raise ValueError("CPF inválido")
+    phone = None
+    raw_phone = str(rec.get("phone") or "").strip()
+    if raw_phone:
+        # mesma regra do link do WhatsApp: só dígitos, mínimo 10 (DDD + número)
+        if format_phone_to_wa(raw_phone):
+            phone = only_digits(raw_phone)
+        else:
+            warnings.append(f"telefone ignorado: {raw_phone}")
+    email = str(rec.get("email") or "").strip() or None
+    birthday = _parse_date(rec.get("birthday"))
+    store_id = default_store_id
+    raw_store = rec.get("store")
+    if raw_store not in (None, ""):
+        key = str(raw_store).strip()
+        key = int(float(key)) if key.replace(".", "", 1).isdigit() else key.lower()
+        if key not in stores:
+            raise ValueError(f"loja desconhecida: {raw_store}")
+        store_id = stores[key]
+    row = {
+        "name": name,
+        "cpf": cpf,
+        "phone": phone,
+        "email": email,
+        "birthday": birthday,
+        "store_id": store_id,
+        "created_at": datetime.utcnow(),
+        "visits_balance": 0,
+        "lifetime_visits": 0,
+        **Client.derived(name=name, cpf=cpf, phone=phone, birthday=birthday),
+    }
+    return row, warnings
+
+
+# ======================================================
+# IMPORTAÇÃO
+# ======================================================
+
+class Report:
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        self.errors = 0
+        self.warnings = 0
+        self.items = []
+
+    def add(self, kind: str, lineno: int, message: str, cpf: str | None = None):
+        if kind == "error":
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if len(self.items) < MAX_REPORTED:
+            self.items.append({"row": lineno, "type": kind, "cpf": cpf, "message": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "details": self.items,
+            "details_truncated": self.errors + self.warnings > len(self.items),
+        }
+
+
+def _insert_chunk(db, chunk: list[tuple[int, dict]], report: Report, dry_run: bool) -> None:
+    cpfs = [row["cpf"] for _, row in chunk]
+    existing = set(
+        db.execute(select(Client.cpf_digits).where(Client.cpf_digits.in_(cpfs))).scalars()
+    )
+    fresh = []
+    for lineno, row in chunk:
+        if row["cpf"] in existing:
+            report.add("error", lineno, "CPF já cadastrado", row["cpf"])
+        else:
+            fresh.append((lineno, row))
+    if not fresh or dry_run:
+        report.inserted += len(fresh)
+        return
+    try:
+        db.execute(insert(Client), [row for _, row in fresh])
+        _bump_rollups(db, [row for _, row in fresh])
+        db.commit()
+        report.inserted += len(fresh)
+    except IntegrityError:
+        # corrida com cadastro simultâneo: refaz linha a linha para isolar o conflito
+        db.rollback()
+        for lineno, row in fresh:
+            try:
+                db.execute(insert(Client), [row])
+                _bump_rollups(db, [row])
+                db.commit()
+                report.inserted += 1
+            except IntegrityError:
+                db.rollback()
+                report.add("error", lineno, "CPF já cadastrado", row["cpf"])
+
+
+def _bump_rollups(db, rows: list[dict]) -> None:
+    for store_id, n in Counter(r["store_id"] for r in rows).items():
+        rollups.bump(db, store_id, new_clients=n)
+
+
+def import_clients(db, stream, filename: str, default_store_id: int | None = None,
+                   dry_run: bool = False) -> dict:
+    stores = {}
+    for sid, name in db.execute(select(Store.id, Store.name)):
+        stores[sid] = sid
+        stores[name.strip().lower()] = sid
+
+    report = Report()
+    # CPFs do arquivo inteiro: no dry_run os lotes anteriores não chegam ao banco, então
+    # limpar a cada lote deixaria passar repetidos entre lotes
+    seen = set()
+    chunk: list[tuple[int, dict]] = []
+    for lineno, rec in iter_records(stream, filename):
+        report.total += 1
+        try:
+            row, warnings = normalize(rec, stores, default_store_id)
+        except ValueError as e:
+            report.add("error", lineno, str(e), only_digits(str(rec.get("cpf") or "")) or None)
+            continue
+        for w in warnings:
+            report.add("warning", lineno, w, row["cpf"])
+        if row["cpf"] in seen:
+            report.add("error", lineno, "CPF repetido no arquivo", row["cpf"])
+            continue
+        seen.add(row["cpf"])
+        chunk.append((lineno, row))
+        if len(chunk) >= CHUNK_SIZE:
+            _insert_chunk(db, chunk, report, dry_run)
+            chunk = []
+    if chunk:
+        _insert_chunk(db, chunk, report, dry_run)
+    return report.as_dict()
@@ -0,0 +1,125 @@
+# loyalty.py — saldo de visitas do programa de fidelidade
+# O saldo fica desnormalizado em Client (visits_balance / lifetime_visits) e é
+# atualizado na MESMA transação do insert da visita; a tabela visits vira histórico.
+# O resgate consome as `meta` visitas mais antigas em aberto (Visit.redemption_id).
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+from .models import Client, Visit, Redemption, ArchivedCycle
+from .util import only_digits
+
+
+def client_by_cpf(db, cpf: str, lock: bool = False) -> Client | None:
+    """Cliente pelo CPF com ou sem máscara (compara só os dígitos, pelo ix_clients_cpf_digits)."""
+    digits = only_digits(cpf)
+    if not digits:
+        return None
+    q = select(Client).where(Client.cpf_digits == digits).order_by(Client.id).limit(1)
+    if lock:
+        q = q.with_for_update()
+    return db.execute(q).scalars().first()
+
+
+def add_visit(db, client: Client, store_id: int | None, created_at: datetime | None = None,
+              uuid: str | None = None) -> tuple[Visit, int]:
+    """Insere a visita e incrementa os contadores do cliente. Não faz commit."""
+    v = Visit(client_id=client.id, store_id=store_id, created_at=created_at or datetime.utcnow(), uuid=uuid)
+    db.add(v)
+    balance = db.execute(
+        update(Client)
+        .where(Client.id == client.id)
+        .values(
+            visits_balance=Client.visits_balance + 1,
+            lifetime_visits=Client.lifetime_visits + 1,
+        )
+        .returning(Client.visits_balance)
+    ).scalar_one()
+    db.flush()
+    return v, int(balance)
+
+
+def recent_visit(db, client_id: int, seconds: int, exclude_id: int | None = None,
+                 at: datetime | None = None) -> Visit | None:
+    """Última visita do cliente a menos de `seconds` segundos de `at` (padrão: agora),
+    antes ou depois (ix_visits_client_created)."""
+    at = at or datetime.utcnow()
+    window = timedelta(seconds=seconds)
+    q = (
+        select(Visit)
+        .where(Visit.client_id == client_id, Visit.created_at.between(at - window, at + window))
+        .order_by(Visit.created_at.desc())
+        .limit(1)
+    )
+    if exclude_id is not None:
+        q = q.where(Visit.id != exclude_id)
+    return db.execute(q).scalars().first()
+
+
+def redeem(db, client: Client, store_id: int | None, meta: int, gift_name: str,
+           created_at: datetime | None = None, uuid: str | None = None) -> tuple[Redemption | None, int]:
+    """Consome exatamente `meta` visitas (as mais antigas em aberto). Não faz commit.
+
+    O UPDATE condicional do saldo é o ponto de serialização: no Postgres espera o lock
+    da linha do cliente (SELECT ... FOR UPDATE de quem chama) e no SQLite pega o lock
+    de escrita do banco, então dois resgates simultâneos nunca passam os dois da meta.
+    Devolve (None, saldo atual) se o saldo não alcança a meta.
+    """
+    balance = db.execute(
+        update(Client)
+        .where(Client.id == client.id, Client.visits_balance >= meta)
+        .values(visits_balance=Client.visits_balance - meta)
+        .returning(Client.visits_balance)
+    ).scalar_one_or_none()
+    if balance is None:
+        return None, int(db.execute(select(Client.visits_balance).where(Client.id == client.id)).scalar() or 0)
+
+    r = Redemption(client_id=client.id, store_id=store_id, gift_name=gift_name,
+                   created_at=created_at or datetime.utcnow(), uuid=uuid)
+    db.add(r)
+    db.flush()
+    oldest_open = (
+        select(Visit.id)
+        .where(Visit.client_id == client.id, Visit.redemption_id.is_(None))
+        .order_by(Visit.created_at, Visit.id)
+        .limit(meta)
+    )
+    db.execute(
+        update(Visit)
+        .where(Visit.id.in_(oldest_open))
+        .values(redemption_id=r.id)
+        .execution_options(synchronize_session=False)
+    )
+    return r, int(balance)
+
+
+# ======================================================
+# BACKFILL / RECONCILIAÇÃO
+# ======================================================
+
+def reconcile_balances(db) -> int:
+    """Recalcula os contadores a partir de visits.
+
+    lifetime_visits = todas as visitas do cliente (inclusive as de ciclos arquivados)
+    visits_balance  = visitas ainda não consumidas por um resgate (redemption_id NULL)
+    Retorna quantos clientes mudaram.
+    """
+    archived = (
+        select(func.coalesce(func.sum(ArchivedCycle.visits), 0))
+        .where(ArchivedCycle.client_id == Client.id)
+        .scalar_subquery()
+    )
+    lifetime = (
+        select(func.count(Visit.id)).where(Visit.client_id == Client.id).scalar_subquery() + archived
+    )
+    balance = (
+        select(func.count(Visit.id))
+        .where(Visit.client_id == Client.id, Visit.redemption_id.is_(None))
+        .scalar_subquery()
+    )
+    res = db.execute(
+        update(Client)
+        .where((Client.lifetime_visits != lifetime) | (Client.visits_balance != balance))
+        .values(lifetime_visits=lifetime, visits_balance=balance)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount or 0
@@ -1,24 +1,31 @@
 import os
 from datetime import datetime, timedelta, date
-from flask import Flask, request, jsonify
+from functools import wraps
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager,
     create_access_token,
-    jwt_required,
+    create_refresh_token,
     get_jwt,
     get_jwt_identity,
+    jwt_required,
 )
-from sqlalchemy import func, select, delete
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
-from urllib.parse import quote
 import re
 
-from .db import Base, engine, SessionLocal
-from .models import User, Store, Client, Visit, Redemption
-from .util import hash_password, verify_password
-from . import emailer
+from .db import engine, read_engine, Session, SessionLocal, pool_stats
+from .models import User, Store, Client
+from .util import TTLCache, only_digits
+from .passwords import hash_password, verify_and_update, PasswordBusy
+from . import (
+    birthdays, campaigns, exports, history, idempotency, imagegen, importer, loyalty, messages, metrics, migrations,
+    outbox, rollups, search, stores, sync,
+)
+from .auth import current_user, invalidate_user, users_changed, password_stamp, token_revoked
+from .pagination import clamp_per_page, encode_cursor, decode_cursor, InvalidCursor
 
 load_dotenv()
 
@@ -42,10 +49,77 @@ CORS(
     resources={r"/api/*": {"origins": allowed_origins}},
     supports_credentials=True,
     methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "Idempotency-Key", "X-Read-Primary"],
 )
 
 jwt = JWTManager(app)
+jwt.token_in_blocklist_loader(token_revoked)  # usuário excluído: 401 em qualquer worker
+
+
+# métricas por rota/SQL (expostas em /api/_metrics)
+metrics.init_app(app)
+metrics.instrument_engine(engine, "primary")
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine, "replica")
+metrics.Gauge("db_pool_checked_out", "Conexões em uso",
+              lambda: {e: st.get("checked_out", 0) for e, st in _pools().items()}, ("engine",))
+metrics.Gauge("db_pool_overflow", "Conexões além do DB_POOL_SIZE",
+              lambda: {e: st.get("overflow", 0) for e, st in _pools().items()}, ("engine",))
+metrics.Gauge("db_pool_timeouts_total", "Checkouts que estouraram DB_POOL_TIMEOUT",
+              lambda: {e: st.get("timeouts", 0) for e, st in _pools().items()}, ("engine",), kind="counter")
+metrics.Gauge("db_pool_wait_seconds_total", "Espera acumulada por conexão do pool",
+              lambda: {e: st.get("wait_ms_total", 0) / 1000 for e, st in _pools().items()}, ("engine",),
+              kind="counter")
+metrics.Gauge("card_cache_hits_total", "Artes servidas do LRU",
+              imagegen.cache_hits, kind="counter")
+metrics.Gauge("email_outbox_pending", "E-mails na fila (PENDENTE)", outbox.pending_count)
+
+
+def _pools() -> dict:
+    stats = pool_stats()
+    replica = stats.pop("replica", None)
+    return {"primary": stats, **({"replica": replica} if replica else {})}
+
+
+@app.teardown_appcontext
+def _remove_session(exc=None):
+    # uma sessão por requisição (SessionLocal); devolve a conexão ao pool no fim
+    SessionLocal.remove()
+
+
+# ======================================================
+# RÉPLICA DE LEITURA (DATABASE_READ_URL)
+# ======================================================
+# Endpoints com @replica_reads leem da réplica. Quem acabou de escrever (visita,
+# resgate, cadastro...) volta a ler do primário por READ_YOUR_WRITES_SECONDS neste
+# processo; o header X-Read-Primary força o primário (ex.: quando cai em outro worker).
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+_recent_writers = TTLCache(READ_YOUR_WRITES_SECONDS, 4096)
+
+
+def _use_replica() -> bool:
+    if read_engine is engine or request.headers.get("X-Read-Primary"):
+        return False
+    user = current_user()
+    return not (user and _recent_writers.get(user.id))
+
+
+def replica_reads(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        SessionLocal().info["replica"] = _use_replica()
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+@app.after_request
+def _remember_writer(resp):
+    p = g.get("principal")
+    if p and request.method in ("POST", "PUT", "PATCH", "DELETE") and resp.status_code < 400:
+        _recent_writers.set(p.id, True)
+    return resp
+
 
 STORE_NAMES = [
     "Mega Loja – Jabaquara",
@@ -57,61 +131,83 @@ STORE_NAMES = [
     "Osasco",
 ]
 
-GIFT_NAME = os.getenv("GIFT_NAME", "1 Kg de Vela Palito")
+GIFT_NAME = messages.GIFT_NAME  # env GIFT_NAME
 DEFAULT_META = int(os.getenv("DEFAULT_META", "10"))
+# o mesmo cliente não pontua duas vezes dentro da janela (0 desliga)
+VISIT_COOLDOWN_SECONDS = int(os.getenv("VISIT_COOLDOWN_SECONDS", "60"))
+# refresh token: renova o acesso (8 h) sem digitar senha nem rodar PBKDF2
+REFRESH_TOKEN_HOURS = int(os.getenv("REFRESH_TOKEN_HOURS", "24"))
 
-
-def current_user():
-    identity = get_jwt_identity()
-    if not identity:
-        return None
-    db = SessionLocal()
-    try:
-        return db.get(User, int(identity))
-    finally:
-        db.close()
+# contagem de clientes por escopo de loja para ?total=cached
+_clients_total_cache = TTLCache(float(os.getenv("CLIENTS_TOTAL_TTL", "60")), 64)
 
 
 # ======================================================
 # AUTH
 # ======================================================
 
+def _token_payload(user: User) -> dict:
+    """Access token (8 h; os claims são informativos, a permissão vem de current_user) + refresh token."""
+    claims = {
+        "role": user.role,
+        "lock_loja": user.lock_loja,
+        "store_id": user.store_id,
+    }
+    token = create_access_token(
+        identity=str(user.id),
+        additional_claims=claims,
+        expires_delta=timedelta(hours=8),
+    )
+    refresh_token = create_refresh_token(
+        identity=str(user.id),
+        additional_claims={"pwd": password_stamp(user.password_hash)},
+        expires_delta=timedelta(hours=REFRESH_TOKEN_HOURS),
+    )
+    return {
+        "token": token,
+        "refresh_token": refresh_token,
+        "user": {
+            "id": user.id,
+            "name": user.name,
+            "email": user.email,
+            "role": user.role,
+            "lock_loja": user.lock_loja,
+            "store_id": user.store_id,
+        },
+    }
+
+
 @app.post("/api/auth/login")
 def login():
     data = request.get_json(force=True)
     email = data.get("email", "").strip().lower()
     password = data.get("password", "")
     db = SessionLocal()
+    user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    if not user:
+        return jsonify({"error": "Credenciais inválidas"}), 401
     try:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
-        if not user or not verify_password(password, user.password_hash):
-            return jsonify({"error": "Credenciais inválidas"}), 401
+        ok, new_hash = verify_and_update(password, user.password_hash)
+    except PasswordBusy:
+        return jsonify({"error": "Muitos logins ao mesmo tempo, tente novamente"}), 503, {"Retry-After": "2"}
+    if not ok:
+        return jsonify({"error": "Credenciais inválidas"}), 401
+    if new_hash:
+        # esquema/rounds mudaram (PASSWORD_SCHEMES/PASSWORD_ROUNDS): regrava no formato atual
+        user.password_hash = new_hash
+        db.commit()
+    return jsonify(_token_payload(user))
 
-        claims = {
-            "role": user.role,
-            "lock_loja": user.lock_loja,
-            "store_id": user.store_id,
-        }
-        token = create_access_token(
-            identity=str(user.id),
-            additional_claims=claims,
-            expires_delta=timedelta(hours=8),
-        )
-        return jsonify(
-            {
-                "token": token,
-                "user": {
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email,
-                    "role": user.role,
-                    "lock_loja": user.lock_loja,
-                    "store_id": user.store_id,
-                },
-            }
-        )
-    finally:
-        db.close()
+
+@app.post("/api/auth/refresh")
+@jwt_required(refresh=True)
+def refresh():
+    """Troca o refresh token por um par novo, sem PBKDF2. Troca de senha invalida o refresh."""
+    db = SessionLocal()
+    user = db.get(User, int(get_jwt_identity()))
+    if not user or get_jwt().get("pwd") != password_stamp(user.password_hash):
+        return jsonify({"error": "Sessão expirada, entre novamente"}), 401
+    return jsonify(_token_payload(user))
 
 
 @app.get("/api/auth/me")
@@ -137,23 +233,52 @@ def me():
 # ======================================================
 
 def _require_admin():
-    claims = get_jwt()
-    return claims.get("role") == "ADMIN"
+    user = current_user()
+    return bool(user) and user.role == "ADMIN"
 
 
 @app.get("/api/admin/stores")
 @jwt_required()
+@replica_reads
 def list_stores():
     if not _require_admin():
         return jsonify({"error": "forbidden"}), 403
     db = SessionLocal()
+    rows = db.execute(select(Store).order_by(Store.id)).scalars().all()
+    return jsonify(
+        [{"id": s.id, "name": s.name, "meta_visitas": s.meta_visitas} for s in rows]
+    )
+
+
+@app.put("/api/admin/stores/<int:sid>")
+@jwt_required()
+def update_store(sid: int):
+    """Altera meta_visitas (e/ou nome) da loja e avisa os processos pelo config_versions."""
+    if not _require_admin():
+        return jsonify({"error": "forbidden"}), 403
+    data = request.get_json(force=True)
+    db = SessionLocal()
+    s = db.get(Store, sid)
+    if not s:
+        return jsonify({"error": "not found"}), 404
+    if "meta_visitas" in data:
+        try:
+            meta = int(data["meta_visitas"])
+        except (TypeError, ValueError):
+            meta = 0
+        if meta < 1:
+            return jsonify({"error": "meta_visitas deve ser um inteiro positivo"}), 400
+        s.meta_visitas = meta
+    if (data.get("name") or "").strip():
+        s.name = data["name"].strip()
+    stores.bump_version(db)
     try:
-        stores = db.execute(select(Store)).scalars().all()
-        return jsonify(
-            [{"id": s.id, "name": s.name, "meta_visitas": s.meta_visitas} for s in stores]
-        )
-    finally:
-        db.close()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return jsonify({"error": "Já existe uma loja com esse nome"}), 400
+    stores.registry.invalidate()
+    return jsonify({"id": s.id, "name": s.name, "meta_visitas": s.meta_visitas})
 
 
 @app.post("/api/admin/users")
@@ -193,34 +318,30 @@ def create_user():
     except IntegrityError:
         db.rollback()
         return jsonify({"error": "email já existe"}), 400
-    finally:
-        db.close()
 
 
 @app.get("/api/admin/users")
 @jwt_required()
+@replica_reads
 def list_users():
     if not _require_admin():
         return jsonify({"error": "forbidden"}), 403
     db = SessionLocal()
-    try:
-        q = select(User).order_by(User.id.desc())
-        items = db.execute(q).scalars().all()
-        return jsonify(
-            [
-                {
-                    "id": u.id,
-                    "name": u.name,
-                    "email": u.email,
-                    "role": u.role,
-                    "lock_loja": u.lock_loja,
-                    "store_id": u.store_id,
-                }
-                for u in items
-            ]
-        )
-    finally:
-        db.close()
+    q = select(User).order_by(User.id.desc())
+    items = db.execute(q).scalars().all()
+    return jsonify(
+        [
+            {
+                "id": u.id,
+                "name": u.name,
+                "email": u.email,
+                "role": u.role,
+                "lock_loja": u.lock_loja,
+                "store_id": u.store_id,
+            }
+            for u in items
+        ]
+    )
 
 
 @app.put("/api/admin/users/<int:uid>")
@@ -230,31 +351,30 @@ def update_user(uid):
         return jsonify({"error": "forbidden"}), 403
     data = request.get_json(force=True)
     db = SessionLocal()
-    try:
-        u = db.get(User, uid)
-        if not u:
-            return jsonify({"error": "not found"}), 404
-        u.name = data.get("name", u.name).strip()
-        new_email = data.get("email", u.email).strip().lower()
-        if new_email != u.email:
-            exists = (
-                db.execute(
-                    select(User).where(User.email == new_email, User.id != u.id)
-                )
-                .scalar_one_or_none()
+    u = db.get(User, uid)
+    if not u:
+        return jsonify({"error": "not found"}), 404
+    u.name = data.get("name", u.name).strip()
+    new_email = data.get("email", u.email).strip().lower()
+    if new_email != u.email:
+        exists = (
+            db.execute(
+                select(User).where(User.email == new_email, User.id != u.id)
             )
-            if exists:
-                return jsonify({"error": "email já existe"}), 400
-            u.email = new_email
-        u.role = data.get("role", u.role)
-        u.store_id = data.get("store_id", u.store_id)
-        u.lock_loja = True if u.store_id else False
-        if data.get("password"):
-            u.password_hash = hash_password(data["password"])
-        db.commit()
-        return jsonify({"ok": True})
-    finally:
-        db.close()
+            .scalar_one_or_none()
+        )
+        if exists:
+            return jsonify({"error": "email já existe"}), 400
+        u.email = new_email
+    u.role = data.get("role", u.role)
+    u.store_id = data.get("store_id", u.store_id)
+    u.lock_loja = True if u.store_id else False
+    if data.get("password"):
+        u.password_hash = hash_password(data["password"])
+    users_changed(db)
+    db.commit()
+    invalidate_user(uid)
+    return jsonify({"ok": True})
 
 
 @app.delete("/api/admin/users/<int:uid>")
@@ -263,15 +383,14 @@ def delete_user(uid):
     if not _require_admin():
         return jsonify({"error": "forbidden"}), 403
     db = SessionLocal()
-    try:
-        u = db.get(User, uid)
-        if not u:
-            return jsonify({"error": "not found"}), 404
-        db.delete(u)
-        db.commit()
-        return jsonify({"ok": True})
-    finally:
-        db.close()
+    u = db.get(User, uid)
+    if not u:
+        return jsonify({"error": "not found"}), 404
+    db.delete(u)
+    users_changed(db)
+    db.commit()
+    invalidate_user(uid)
+    return jsonify({"ok": True})
 
 
 # ======================================================
@@ -296,73 +415,149 @@ def create_client():
             store_id=(data.get("store_id") or user.store_id),
         )
         db.add(c)
+        rollups.bump(db, c.store_id, new_clients=1)
         db.commit()
         return jsonify({"id": c.id}), 201
     except IntegrityError:
         db.rollback()
         return jsonify({"error": "CPF já cadastrado"}), 400
-    finally:
-        db.close()
 
 
 @app.get("/api/clientes")
 @jwt_required()
+@replica_reads
 def list_clients():
+    """Lista clientes.
+
+    - paginação por cursor: `?cursor=` (vazio = primeira página) e depois o
+      `next_cursor` devolvido; ordem (created_at, id) decrescente.
+    - paginação clássica: `?page=N` (OFFSET; mantida para compatibilidade).
+    - `total`: exact (padrão no modo page), cached (contagem em cache por alguns
+      segundos) ou none (padrão no modo cursor).
+    """
     user = current_user()
     cpf = (request.args.get("cpf") or "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 10))
+    cursor = request.args.get("cursor")
+    per_page = clamp_per_page(request.args.get("per_page"))
+    total_mode = request.args.get("total") or ("none" if cursor is not None else "exact")
     db = SessionLocal()
-    try:
-        q = select(Client)
-        if cpf:
-            q = q.where(Client.cpf == cpf)
-        elif user.lock_loja and user.store_id:
-            q = q.where(Client.store_id == user.store_id)
+    q = select(Client)
+    scope = None
+    if cpf:
+        q = q.where(Client.cpf_digits == only_digits(cpf))
+    elif user.lock_loja and user.store_id:
+        scope = user.store_id
+        q = q.where(Client.store_id == scope)
+
+    total = None
+    if total_mode == "exact" or (total_mode == "cached" and cpf):
         total = db.execute(select(func.count()).select_from(q.subquery())).scalar_one()
-        items = (
-            db.execute(
-                q.order_by(Client.created_at.desc())
-                .offset((page - 1) * per_page)
-                .limit(per_page)
-            )
-            .scalars()
-            .all()
-        )
-        return jsonify(
-            {
-                "total": total,
-                "items": [
-                    {
-                        "id": c.id,
-                        "name": c.name,
-                        "cpf": c.cpf,
-                        "phone": c.phone,
-                        "email": c.email,
-                        "birthday": c.birthday.isoformat() if c.birthday else None,
-                        "store_id": c.store_id,
-                    }
-                    for c in items
-                ],
-            }
-        )
-    finally:
-        db.close()
+    elif total_mode == "cached":
+        total = _clients_total_cache.get(scope)
+        if total is None:
+            total = db.execute(select(func.count()).select_from(q.subquery())).scalar_one()
+            _clients_total_cache.set(scope, total)
+
+    q = q.order_by(Client.created_at.desc(), Client.id.desc())
+    if cursor is not None:
+        if cursor:
+            try:
+                after_at, after_id = decode_cursor(cursor, datetime, int)
+            except InvalidCursor:
+                return jsonify({"error": "cursor inválido"}), 400
+            q = q.where(tuple_(Client.created_at, Client.id) < tuple_(after_at, after_id))
+    else:
+        page = max(1, int(request.args.get("page", 1)))
+        q = q.offset((page - 1) * per_page)
+    rows = db.execute(q.limit(per_page + 1)).scalars().all()
+    items = rows[:per_page]
+    next_cursor = (
+        encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > per_page else None
+    )
+    return jsonify(
+        {
+            "total": total,
+            "next_cursor": next_cursor,
+            "items": [
+                {
+                    "id": c.id,
+                    "name": c.name,
+                    "cpf": c.cpf,
+                    "phone": c.phone,
+                    "email": c.email,
+                    "birthday": c.birthday.isoformat() if c.birthday else None,
+                    "store_id": c.store_id,
+                }
+                for c in items
+            ],
+        }
+    )
 
 
-# ======================================================
-# HELPERS
-# ======================================================
+@app.get("/api/clientes/busca")
+@jwt_required()
+def search_clients():
+    """Busca type-ahead por nome (sem acento), CPF ou telefone (prefixo), em todas as lojas."""
+    q = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit", 20, type=int)
+    if len(q) < 2:
+        return jsonify({"items": []})
+    db = SessionLocal()
+    return jsonify({"items": search.search_clients(db, q, limit)})
+
+
+@app.get("/api/clientes/<int:cid>/historico")
+@jwt_required()
+@replica_reads
+def client_history(cid: int):
+    """Resumo do cliente: visitas por loja, resgates e progresso do ciclo atual."""
+    user = current_user()
+    db = SessionLocal()
+    c = db.get(Client, cid)
+    if not c:
+        return jsonify({"error": "Cliente não encontrado"}), 404
+    # meta da loja que registraria a visita (como em /api/resgates)
+    meta = stores.registry.meta(db, user.store_id or c.store_id, DEFAULT_META)
+    return jsonify(history.summary(db, c, meta))
+
+
+@app.get("/api/clientes/<int:cid>/extrato")
+@jwt_required()
+@replica_reads
+def client_ledger(cid: int):
+    """Extrato de visitas e resgates, do mais recente ao mais antigo, por cursor."""
+    per_page = clamp_per_page(request.args.get("per_page"))
+    db = SessionLocal()
+    if not db.get(Client, cid):
+        return jsonify({"error": "Cliente não encontrado"}), 404
+    try:
+        items, next_cursor = history.ledger(db, cid, per_page, request.args.get("cursor") or None)
+    except InvalidCursor:
+        return jsonify({"error": "cursor inválido"}), 400
+    return jsonify({"items": items, "next_cursor": next_cursor})
 
-def _format_phone_to_wa(phone: str) -> str | None:
-    if not phone:
-        return None
-    digits = "".join(ch for ch in phone if ch.isdigit())
-    if len(digits) < 10:
-        return None
-    if not digits.startswith("55"):
-        digits = "55" + digits
-    return digits
+
+@app.post("/api/clientes/import")
+@jwt_required()
+def import_clients():
+    """Importação em lote (multipart, campo `file`, .csv ou .xlsx). Somente ADMIN.
+
+    Colunas: nome, cpf, telefone, email, nascimento, loja (nome ou id).
+    `store_id` (form) é a loja padrão; `dry_run=1` só valida.
+    """
+    if not _require_admin():
+        return jsonify({"error": "forbidden"}), 403
+    f = request.files.get("file")
+    if not f:
+        return jsonify({"error": "envie o arquivo no campo 'file'"}), 400
+    default_store = request.form.get("store_id", type=int)
+    dry_run = request.form.get("dry_run", "").lower() in ("1", "true")
+    db = SessionLocal()
+    try:
+        report = importer.import_clients(db, f.stream, f.filename, default_store, dry_run)
+        return jsonify(report)
+    except importer.ImportFormatError as e:
+        return jsonify({"error": str(e)}), 400
 
 
 # ======================================================
@@ -372,103 +567,131 @@ def _format_phone_to_wa(phone: str) -> str | None:
 @app.post("/api/visitas")
 @jwt_required()
 def register_visit():
+    """Registra a visita. Com o header Idempotency-Key, repetir a requisição devolve a
+    resposta original; sem ele, VISIT_COOLDOWN_SECONDS barra a leitura duplicada (409)."""
     user = current_user()
     data = request.get_json(force=True)
     cpf = (data.get("cpf") or "").strip()
+    idem_key = idempotency.key_from(request)
+    fp = idempotency.fingerprint(data)
+    sw = metrics.Stopwatch("visita")  # tempo por etapa em app_step_duration_seconds
     db = SessionLocal()
+    if idem_key:
+        saved = idempotency.lookup(db, user.id, idem_key)
+        if saved:
+            return idempotency.replay(saved, fp)
+        sw.lap("idempotencia")
+
+    c = loyalty.client_by_cpf(db, cpf)
+    if not c:
+        return jsonify({"error": "Cliente não encontrado"}), 404
+
+    # loja que está registrando
+    store_id = user.store_id or c.store_id or stores.registry.default_id(db)
+
+    sw.lap("cliente")
+
+    # visita + saldo + rollup do dashboard na mesma transação
+    v, count_visits = loyalty.add_visit(db, c, store_id)
+    sw.lap("saldo")
+
+    # o UPDATE do saldo trava a linha do cliente (Postgres), então a checagem
+    # enxerga a visita de uma requisição concorrente que já tenha feito commit
+    if VISIT_COOLDOWN_SECONDS > 0:
+        recent = loyalty.recent_visit(db, c.id, VISIT_COOLDOWN_SECONDS, exclude_id=v.id)
+        if recent:
+            db.rollback()
+            # retentativa concorrente com a mesma chave: a primeira já gravou a resposta
+            saved = idempotency.lookup(db, user.id, idem_key) if idem_key else None
+            if saved:
+                return idempotency.replay(saved, fp)
+            wait = VISIT_COOLDOWN_SECONDS - int((datetime.utcnow() - recent.created_at).total_seconds())
+            return (
+                jsonify(
+                    {
+                        "error": "Visita já registrada para este cliente há instantes",
+                        "visit_id": recent.id,
+                        "retry_after": max(1, wait),
+                    }
+                ),
+                409,
+                {"Retry-After": str(max(1, wait))},
+            )
+
+    sw.lap("cooldown")
+    rollups.bump(db, store_id, visits=1)
+    sw.lap("rollup")
+
+    # pontos/visitas
+    meta = stores.registry.meta(db, store_id, DEFAULT_META)
+    eligible = count_visits >= meta
+    faltam = max(0, meta - count_visits)
+
+    # email (se cadastrado)
+    titulo = "Sua pontuação - Programa de Fidelidade Casa do Cigano"
+    texto_email = (
+        f"Olá {c.name},\n\nVocê agora tem {count_visits} visita(s). Meta para brinde: {meta}. "
+    )
+    if eligible:
+        texto_email += f"Você JÁ PODE resgatar seu brinde ({GIFT_NAME})!"
+    else:
+        texto_email += f"Faltam {faltam} visita(s) para o próximo brinde ({GIFT_NAME})."
+    texto_email += "\n\nObrigado pela visita!"
+    html = f"""
+    <p>Olá <b>{c.name}</b>,</p>
+    <p>Você agora tem <b>{count_visits}</b> visita(s). Meta para brinde: <b>{meta}</b>.</p>
+    <p>{'Você <b>JÁ PODE</b> resgatar seu brinde ('+GIFT_NAME+')!' if eligible else f'Faltam <b>{faltam}</b> visita(s) para o próximo brinde ('+GIFT_NAME+').'}</p>
+    <p>Obrigado pela visita!<br/>Casa do Cigano</p>
+    """
+    TEST_EMAIL_TO = os.getenv("TEST_EMAIL_TO", "").strip()
+    to_email = (c.email or "").strip() or TEST_EMAIL_TO
+    if to_email:
+        # vai para o outbox na mesma transação; o envio SMTP acontece fora da requisição
+        outbox.enqueue_email(db, to_email, titulo, texto_email, html)
+    sw.lap("email")
+
+    # WhatsApp (templates em messages.py; telefone já normalizado em phone_wa)
+    wa = None
+    if c.phone_wa:
+        template = messages.VISITA_ELEGIVEL if eligible else messages.VISITA_PROGRESSO
+        wa = template.url(c.phone_wa, nome=messages.first_name(c.name), visitas=int(count_visits),
+                          faltam=int(faltam), meta=int(meta))
+
+    body = {
+        "visit_id": v.id,
+        "visits_count": int(count_visits),
+        "meta": int(meta),
+        "eligible": bool(eligible),
+        "store_id": store_id,
+        "client": {
+            "id": c.id,
+            "name": c.name,
+            "cpf": c.cpf,
+            "phone": c.phone,
+            "email": c.email,
+        },
+        "whatsapp_url": wa,
+    }
+    if idem_key:
+        # resposta gravada junto com a visita: ou fica tudo, ou nada
+        idempotency.save(db, user.id, idem_key, "POST /api/visitas", fp, body)
+    sw.lap("whatsapp")
     try:
-        c = db.execute(select(Client).where(Client.cpf == cpf)).scalar_one_or_none()
-        if not c:
-            return jsonify({"error": "Cliente não encontrado"}), 404
-
-        # loja que está registrando
-        store_id = user.store_id or c.store_id
-        if not store_id:
-            st = db.execute(select(Store).order_by(Store.id.asc())).scalars().first()
-            store_id = st.id if st else None
-
-        v = Visit(client_id=c.id, store_id=store_id)
-        db.add(v)
         db.commit()
-
-        # pontos/visitas
-        count_visits = (
-            db.execute(select(func.count(Visit.id)).where(Visit.client_id == c.id))
-            .scalar_one()
-        )
-        store = db.get(Store, store_id) if store_id else None
-        meta = store.meta_visitas if store else DEFAULT_META
-        eligible = count_visits >= meta
-        faltam = max(0, meta - count_visits)
-
-        # email (se cadastrado)
-        titulo = "Sua pontuação - Programa de Fidelidade Casa do Cigano"
-        texto_email = (
-            f"Olá {c.name},\n\nVocê agora tem {count_visits} visita(s). Meta para brinde: {meta}. "
-        )
-        if eligible:
-            texto_email += f"Você JÁ PODE resgatar seu brinde ({GIFT_NAME})!"
-        else:
-            texto_email += f"Faltam {faltam} visita(s) para o próximo brinde ({GIFT_NAME})."
-        texto_email += "\n\nObrigado pela visita!"
-        html = f"""
-        <p>Olá <b>{c.name}</b>,</p>
-        <p>Você agora tem <b>{count_visits}</b> visita(s). Meta para brinde: <b>{meta}</b>.</p>
-        <p>{'Você <b>JÁ PODE</b> resgatar seu brinde ('+GIFT_NAME+')!' if eligible else f'Faltam <b>{faltam}</b> visita(s) para o próximo brinde ('+GIFT_NAME+').'}</p>
-        <p>Obrigado pela visita!<br/>Casa do Cigano</p>
-        """
-        TEST_EMAIL_TO = os.getenv("TEST_EMAIL_TO", "").strip()
-        to_email = (c.email or "").strip() or TEST_EMAIL_TO
-        if to_email:
-            emailer.send_email(to_email, titulo, texto_email, html)
-
-        # WhatsApp (sem emojis, com parágrafos)
-        wa = None
-        if c.phone:
-            digits = _format_phone_to_wa(c.phone)
-            if digits:
-                primeiro_nome = (c.name or "cliente").strip().split()[0]
-                if eligible:
-                    msg = (
-                        f"Oi, {primeiro_nome}! Obrigado por confiar na Casa do Cigano.\n\n"
-                        f"Esperamos que você ame seu novo produto!\n\n"
-                        f"Você está participando do nosso programa de fidelidade *CiganoLovers* e você tem {int(count_visits)} visita(s).\n\n"
-                        f"Você JÁ PODE resgatar seu brinde: {GIFT_NAME} (meta {int(meta)} visitas).\n\n"
-                        "Confira as novidades em nossa loja: https://www.casadocigano.com.br/"
-                    )
-                else:
-                    msg = (
-                        f"Oi, {primeiro_nome}! Obrigado por confiar na Casa do Cigano.\n\n"
-                        f"Esperamos que você ame seu novo produto!\n\n"
-                        f"Você está participando do nosso programa de fidelidade *CiganoLovers* e você tem {int(count_visits)} visita(s).\n\n"
-                        f"Faltam {int(faltam)} visita(s) para o brinde {GIFT_NAME} (meta {int(meta)} visitas).\n\n"
-                        "Confira as novidades em nossa loja: https://www.casadocigano.com.br/"
-                    )
-                wa = f"https://wa.me/{digits}?text=" + quote(msg, safe="", encoding="utf-8")
-
-        return jsonify(
-            {
-                "visit_id": v.id,
-                "visits_count": int(count_visits),
-                "meta": int(meta),
-                "eligible": bool(eligible),
-                "store_id": store_id,
-                "client": {
-                    "id": c.id,
-                    "name": c.name,
-                    "cpf": c.cpf,
-                    "phone": c.phone,
-                    "email": c.email,
-                },
-                "whatsapp_url": wa,
-            }
-        )
-    finally:
-        db.close()
+    except IntegrityError:
+        # mesma chave commitada por uma requisição concorrente: devolve a dela
+        db.rollback()
+        saved = idempotency.lookup(db, user.id, idem_key) if idem_key else None
+        if not saved:
+            raise
+        return idempotency.replay(saved, fp)
+    sw.lap("commit")
+    outbox.wake()
+    return jsonify(body)
 
 
 # ======================================================
-# RESGATES (zera visitas após resgatar)
+# RESGATES (consome `meta` visitas do saldo)
 # ======================================================
 
 @app.post("/api/resgates")
@@ -479,53 +702,72 @@ def redeem_gift():
     cpf = (data.get("cpf") or "").strip()
     gift_name = (data.get("gift_name") or GIFT_NAME).strip()
     db = SessionLocal()
-    try:
-        c = db.execute(select(Client).where(Client.cpf == cpf)).scalar_one_or_none()
-        if not c:
-            return jsonify({"error": "Cliente não encontrado"}), 404
-
-        store_id = user.store_id or c.store_id
-        if not store_id:
-            st = db.execute(select(Store).order_by(Store.id.asc())).scalars().first()
-            store_id = st.id if st else None
-
-        store = db.get(Store, store_id) if store_id else None
-        meta = store.meta_visitas if store else DEFAULT_META
-
-        count_visits = (
-            db.execute(select(func.count(Visit.id)).where(Visit.client_id == c.id))
-            .scalar_one()
+    # FOR UPDATE: no Postgres o resgate segura a linha do cliente até o commit
+    # (visitas e outros resgates do mesmo CPF esperam); no SQLite é ignorado
+    c = loyalty.client_by_cpf(db, cpf, lock=True)
+    if not c:
+        return jsonify({"error": "Cliente não encontrado"}), 404
+
+    store_id = user.store_id or c.store_id or stores.registry.default_id(db)
+    meta = stores.registry.meta(db, store_id, DEFAULT_META)
+
+    # resgate + saldo - meta + visitas consumidas na mesma transação
+    r, balance = loyalty.redeem(db, c, store_id, meta, gift_name)
+    if r is None:
+        db.rollback()
+        return (
+            jsonify(
+                {
+                    "error": "Cliente ainda não atingiu a meta",
+                    "visits_count": balance,
+                    "meta": int(meta),
+                }
+            ),
+            400,
         )
-        if count_visits < meta:
-            return (
-                jsonify(
-                    {
-                        "error": "Cliente ainda não atingiu a meta",
-                        "visits_count": int(count_visits),
-                        "meta": int(meta),
-                    }
-                ),
-                400,
-            )
+    rollups.bump(db, store_id, redemptions=1)
+    db.commit()
 
-        r = Redemption(client_id=c.id, store_id=store_id, gift_name=gift_name)
-        db.add(r)
-        db.commit()
+    return jsonify(
+        {
+            "redemption_id": r.id,
+            "gift_name": r.gift_name,
+            "when": r.created_at.isoformat(),
+            "store_id": store_id,
+            "visits_consumed": int(meta),
+            "visits_count": balance,
+        }
+    )
 
-        # Zera as visitas do cliente após o resgate
-        db.execute(delete(Visit).where(Visit.client_id == c.id))
-        db.commit()
 
-        return jsonify(
-            {
-                "redemption_id": r.id,
-                "gift_name": r.gift_name,
-                "when": r.created_at.isoformat(),
-                "store_id": store_id,
-            }
-        )
-    finally:
-        db.close()
+# ======================================================
+# SINCRONIZAÇÃO DO TERMINAL (lote offline)
+# ======================================================
+
+@app.post("/api/sync")
+@jwt_required()
+def sync_batch():
+    """Aplica um lote `{ops: [{uuid, type: visita|resgate, cpf, at, gift_name?}]}` numa
+    transação e devolve o resultado de cada operação e os saldos (veja sync.py)."""
+    user = current_user()
+    data = request.get_json(force=True)
+    db = SessionLocal()
+    for attempt in range(2):
+        try:
+            body = sync.apply_batch(db, data.get("ops"), user.store_id, DEFAULT_META, GIFT_NAME,
+                                    VISIT_COOLDOWN_SECONDS)
+        except sync.InvalidBatch as e:
+            db.rollback()
+            return jsonify({"error": str(e)}), 400
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            # o mesmo UUID entrou por outro envio concorrente: reaplica e ele vira "duplicado"
+            db.rollback()
+            if attempt:
+                raise
+    return jsonify(body)
 
 
 # ======================================================
@@ -534,56 +776,232 @@ def redeem_gift():
 
 @app.get("/api/dashboard/kpis")
 @jwt_required()
+@replica_reads
 def kpis():
     user = current_user()
+    scope = user.scope_store_id
     db = SessionLocal()
-    try:
-        since = datetime.utcnow() - timedelta(days=30)
-        vq = select(func.count(Visit.id)).where(Visit.created_at >= since)
-        rq = select(func.count(Redemption.id)).where(Redemption.created_at >= since)
-        cq = select(func.count(Client.id))
-        if user.lock_loja and user.store_id:
-            vq = vq.where(Visit.store_id == user.store_id)
-            rq = rq.where(Redemption.store_id == user.store_id)
-            cq = cq.where(Client.store_id == user.store_id)
-        visits_30 = db.execute(vq).scalar_one()
-        redemptions_30 = db.execute(rq).scalar_one()
-        clients_total = db.execute(cq).scalar_one()
-        return jsonify(
-            {
-                "visitas_30d": int(visits_30),
-                "clientes_total": int(clients_total),
-                "resgates_30d": int(redemptions_30),
-            }
-        )
-    finally:
-        db.close()
+    # rollup diário (store_daily_stats) + cache curto por escopo de loja
+    return jsonify(rollups.cached_kpis(db, scope))
 
 
 @app.get("/api/dashboard/aniversariantes")
 @jwt_required()
+@replica_reads
 def birthday_list():
     user = current_user()
     mes = datetime.utcnow().month
     db = SessionLocal()
+    q = select(Client).where(Client.birth_month == mes)
+    if user.lock_loja and user.store_id:
+        q = q.where(Client.store_id == user.store_id)
+    items = db.execute(q).scalars().all()
+    return jsonify(
+        [
+            {
+                "id": c.id,
+                "name": c.name,
+                "cpf": c.cpf,
+                "birthday": c.birthday.isoformat() if c.birthday else None,
+            }
+            for c in items
+        ]
+    )
+
+
+# ======================================================
+# EXPORTAÇÕES (CSV em streaming / XLSX write-only)
+# ======================================================
+
+@app.get("/api/export/<dataset>.<fmt>")
+@jwt_required()
+@replica_reads
+def export_data(dataset, fmt):
+    """/api/export/{clientes|visitas|resgates}.{csv|xlsx}?de=AAAA-MM-DD&ate=AAAA-MM-DD
+
+    Mesmo escopo de loja do dashboard (usuário travado na loja só exporta a sua).
+    """
+    if dataset not in exports.DATASETS or fmt not in ("csv", "xlsx"):
+        return jsonify({"error": "not found"}), 404
+    user = current_user()
     try:
-        q = select(Client).where(func.extract("month", Client.birthday) == mes)
-        if user.lock_loja and user.store_id:
-            q = q.where(Client.store_id == user.store_id)
-        items = db.execute(q).scalars().all()
-        return jsonify(
-            [
-                {
-                    "id": c.id,
-                    "name": c.name,
-                    "cpf": c.cpf,
-                    "birthday": c.birthday.isoformat() if c.birthday else None,
-                }
-                for c in items
-            ]
+        de = request.args.get("de")
+        ate = request.args.get("ate")
+        filters = {
+            "store_id": user.scope_store_id,
+            "since": datetime.fromisoformat(de) if de else None,
+            "until": datetime.fromisoformat(ate) + timedelta(days=1) if ate else None,
+        }
+    except ValueError:
+        return jsonify({"error": "data inválida (use AAAA-MM-DD)"}), 400
+    fname = f"{dataset}_{datetime.utcnow():%Y%m%d}.{fmt}"
+
+    if fmt == "csv":
+        replica = SessionLocal().info.get("replica", False)
+
+        def generate():
+            # o corpo é lido depois do handler retornar: sessão própria, fora do escopo da requisição
+            db = Session(info={"replica": replica})
+            try:
+                yield from exports.stream_csv(db, dataset, **filters)
+            finally:
+                db.close()
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{fname}"'},
         )
-    finally:
-        db.close()
+
+    db = SessionLocal()
+    tmp = exports.write_xlsx(db, dataset, **filters)
+    return send_file(
+        tmp,
+        as_attachment=True,
+        download_name=fname,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+# ======================================================
+# CAMPANHAS (artes do WhatsApp em lote)
+# ======================================================
+
+@app.post("/api/campanhas/artes")
+@jwt_required()
+def start_campaign_cards():
+    """{segmento: aniversariantes|perto-da-meta, mes?, faltam?, formato?, store_id?}
+
+    Renderiza em segundo plano; acompanhe em GET /api/campanhas/artes/<job_id>.
+    Somente ADMIN/GERENTE; com CARD_MAX_JOBS lotes em andamento responde 429.
+    """
+    user = current_user()
+    if user.role not in ("ADMIN", "GERENTE"):
+        return jsonify({"error": "forbidden"}), 403
+    data = request.get_json(force=True) or {}
+    store_id = user.scope_store_id or data.get("store_id")
+    try:
+        status = campaigns.start_job(
+            data.get("segmento") or "",
+            store_id=store_id,
+            month=data.get("mes"),
+            within=int(data.get("faltam") or 2),
+            fmt=data.get("formato"),
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except campaigns.JobsBusy as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "30"}
+    except OSError:
+        return jsonify({"error": "não foi possível iniciar o lote de artes"}), 503
+    return jsonify(status), 202
+
+
+@app.get("/api/campanhas/artes/<job_id>")
+@jwt_required()
+def campaign_cards_status(job_id):
+    status = campaigns.job_status(job_id)
+    if not status:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(status)
+
+
+@app.get("/api/campanhas/artes/<job_id>/download")
+@jwt_required()
+def campaign_cards_download(job_id):
+    status = campaigns.job_status(job_id)
+    if not status:
+        return jsonify({"error": "not found"}), 404
+    if status["status"] != "PRONTO":
+        return jsonify(status), 409
+    return send_file(
+        campaigns.zip_path(job_id),
+        as_attachment=True,
+        download_name=f"artes_{job_id[:8]}.zip",
+        mimetype="application/zip",
+    )
+
+
+@app.get("/api/campanhas/whatsapp.<fmt>")
+@jwt_required()
+@replica_reads
+def campaign_whatsapp_links(fmt):
+    """/api/campanhas/whatsapp.{csv|ndjson}?segmento=aniversariantes|perto-da-meta|elegiveis|todos
+    &faltam=N&mes=M&store_id=ID — um link wa.me com a mensagem de cada cliente, em streaming."""
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "not found"}), 404
+    user = current_user()
+    segment = request.args.get("segmento") or ""
+    if segment not in campaigns.SEGMENTS:
+        return jsonify({"error": f"segmento desconhecido: {segment}"}), 400
+    filters = {
+        "store_id": user.scope_store_id or request.args.get("store_id", type=int),
+        "month": request.args.get("mes", type=int),
+        "within": request.args.get("faltam", 2, type=int),
+    }
+    stream = campaigns.stream_links_csv if fmt == "csv" else campaigns.stream_links_ndjson
+    replica = SessionLocal().info.get("replica", False)
+
+    def generate():
+        # sessão própria: o corpo é lido depois do handler retornar
+        db = Session(info={"replica": replica})
+        try:
+            yield from stream(db, segment, **filters)
+        finally:
+            db.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="whatsapp_{segment}_{datetime.utcnow():%Y%m%d}.{fmt}"'},
+    )
+
+
+@app.get("/api/campanhas/aniversarios")
+@jwt_required()
+@replica_reads
+def birthday_campaign_list():
+    """Aniversariantes de hoje (?dias=1) ou da semana (?dias=7), com o que já foi enviado."""
+    user = current_user()
+    days = min(31, max(1, request.args.get("dias", 1, type=int)))
+    store_id = user.scope_store_id or request.args.get("store_id", type=int)
+    db = SessionLocal()
+    dates = birthdays.window(datetime.utcnow().date(), days)
+    return jsonify(
+        [
+            {
+                "client_id": r["client_id"],
+                "name": r["name"],
+                "store_id": r["store_id"],
+                "birthday": r["birthday"],
+                "email_enviado": "email" in r["sent"],
+                "whatsapp_enviado": "whatsapp" in r["sent"],
+                "whatsapp_url": birthdays.whatsapp_url(r),
+            }
+            for r in birthdays.select_birthdays(db, dates, store_id)
+        ]
+    )
+
+
+@app.post("/api/campanhas/aniversarios")
+@jwt_required()
+def birthday_campaign_run():
+    """{dias?, store_id?}: enfileira os e-mails de parabéns e devolve os links de WhatsApp
+    ainda não enviados (mesma rodada do `manage birthday-run`; não repete envios)."""
+    user = current_user()
+    data = request.get_json(silent=True) or {}
+    days = min(31, max(1, int(data.get("dias") or 1)))
+    store_id = user.scope_store_id or data.get("store_id")
+    db = SessionLocal()
+    result = birthdays.run(db, days=days, store_id=store_id)
+    try:
+        db.commit()
+    except IntegrityError:
+        # outra rodada gravou os mesmos envios ao mesmo tempo
+        db.rollback()
+        return jsonify({"error": "Campanha já em andamento, tente novamente"}), 409
+    outbox.wake()
+    return jsonify(result)
 
 
 # ======================================================
@@ -595,63 +1013,84 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/api/_metrics")
+def metrics_text():
+    """Formato texto do Prometheus. Com METRICS_TOKEN, exige `Authorization: Bearer <token>`."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return jsonify({"error": "forbidden"}), 403
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/api/_health/db")
+def health_db():
+    # pre_ping/recycle já descartam conexões mortas; aqui dá para ver espera/estouro do pool
+    SessionLocal().execute(select(1))
+    return {"status": "ok", "pool": pool_stats()}
+
+
 @app.route("/api/_setup/seed", methods=["POST", "GET"])
 def seed():
-    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     db = SessionLocal()
-    try:
-        # cria lojas padrão
-        for nm in STORE_NAMES:
-            ex = db.execute(select(Store).where(Store.name == nm)).scalar_one_or_none()
-            if not ex:
-                db.add(Store(name=nm, meta_visitas=DEFAULT_META))
-        db.commit()
-
-        # cria admin (todas as lojas)
-        admin = (
-            db.execute(select(User).where(User.email == "admin@cdc.com"))
-            .scalar_one_or_none()
+    # cria lojas padrão
+    created = False
+    for nm in STORE_NAMES:
+        ex = db.execute(select(Store).where(Store.name == nm)).scalar_one_or_none()
+        if not ex:
+            db.add(Store(name=nm, meta_visitas=DEFAULT_META))
+            created = True
+    if created:
+        stores.bump_version(db)
+    db.commit()
+    stores.registry.invalidate()
+
+    # cria admin (todas as lojas)
+    admin = (
+        db.execute(select(User).where(User.email == "admin@cdc.com"))
+        .scalar_one_or_none()
+    )
+    if not admin:
+        admin = User(
+            name="Admin",
+            email="admin@cdc.com",
+            password_hash=hash_password("123456"),
+            role="ADMIN",
+            lock_loja=False,
+            store_id=None,
         )
-        if not admin:
-            admin = User(
-                name="Admin",
-                email="admin@cdc.com",
-                password_hash=hash_password("123456"),
-                role="ADMIN",
-                lock_loja=False,
-                store_id=None,
-            )
-            db.add(admin)
-            db.commit()
+        db.add(admin)
+        db.commit()
 
-        # cria gerente de exemplo (Mascote)
-        mascote = db.execute(select(Store).where(Store.name == "Mascote")).scalar_one()
-        gerente = (
-            db.execute(select(User).where(User.email == "gerente.mascote@cdc.com"))
-            .scalar_one_or_none()
+    # cria gerente de exemplo (Mascote)
+    mascote = db.execute(select(Store).where(Store.name == "Mascote")).scalar_one()
+    gerente = (
+        db.execute(select(User).where(User.email == "gerente.mascote@cdc.com"))
+        .scalar_one_or_none()
+    )
+    if not gerente:
+        gerente = User(
+            name="Gerente Mascote",
+            email="gerente.mascote@cdc.com",
+            password_hash=hash_password("123456"),
+            role="GERENTE",
+            lock_loja=True,
+            store_id=mascote.id,
         )
-        if not gerente:
-            gerente = User(
-                name="Gerente Mascote",
-                email="gerente.mascote@cdc.com",
-                password_hash=hash_password("123456"),
-                role="GERENTE",
-                lock_loja=True,
-                store_id=mascote.id,
-            )
-            db.add(gerente)
-            db.commit()
+        db.add(gerente)
+        db.commit()
 
-        return {"ok": True, "admin_login": "admin@cdc.com", "password": "123456"}
-    finally:
-        db.close()
+    return {"ok": True, "admin_login": "admin@cdc.com", "password": "123456"}
 
 
 # ======================================================
 # BOOT
 # ======================================================
 
+# workers do outbox de e-mail (EMAIL_WORKERS=0 para drenar num processo separado)
+outbox.start_workers()
+
 if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine, log=print)
     # Porta 5000; host 127.0.0.1 para uso local
     app.run(host="127.0.0.1", port=5000, debug=True)
@@ -0,0 +1,189 @@
+# manage.py — comandos de manutenção (rodar a partir de backend/)
+#   python -m src.manage migrate [--status]
+#   python -m src.manage reconcile-visits
+#   python -m src.manage outbox-worker
+#   python -m src.manage rebuild-stats
+#   python -m src.manage prune-idempotency
+#   python -m src.manage render-cards --segment aniversariantes --out artes.zip
+#   python -m src.manage birthday-run [--days 7] [--links links.csv]
+#   python -m src.manage archive-cycles [--older-than-days 365] [--dry-run]
+import argparse
+import csv
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from .db import engine, SessionLocal  # noqa: E402
+from . import birthdays, campaigns, history, idempotency, loyalty, migrations, outbox, rollups  # noqa: E402
+
+
+def cmd_migrate(args):
+    if args.status:
+        todo = set(migrations.pending(engine))
+        for version, _ in migrations.MIGRATIONS:
+            print(("pendente  " if version in todo else "aplicada  ") + version)
+        return
+    applied = migrations.upgrade(engine, log=print)
+    if not applied:
+        print("schema atualizado, nada a aplicar")
+
+
+def cmd_reconcile_visits(args):
+    migrations.upgrade(engine, log=print)
+    db = SessionLocal()
+    try:
+        changed = loyalty.reconcile_balances(db)
+        db.commit()
+        print(f"clientes reconciliados: {changed}")
+    finally:
+        db.close()
+
+
+def cmd_rebuild_stats(args):
+    migrations.upgrade(engine, log=print)
+    db = SessionLocal()
+    try:
+        n = rollups.rebuild(db)
+        db.commit()
+        print(f"linhas em store_daily_stats: {n}")
+    finally:
+        db.close()
+
+
+def cmd_prune_idempotency(args):
+    db = SessionLocal()
+    try:
+        n = idempotency.prune(db)
+        db.commit()
+        print(f"chaves vencidas apagadas: {n}")
+    finally:
+        db.close()
+
+
+def cmd_outbox_worker(args):
+    if args.once:
+        print(f"mensagens processadas: {outbox.drain_once()}")
+        return
+    outbox.start_workers(args.workers)
+    print(f"outbox: {args.workers} worker(s) drenando email_outbox (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        outbox.stop_workers(timeout=10)
+
+
+def cmd_render_cards(args):
+    def load_rows():
+        db = SessionLocal()
+        try:
+            return campaigns.select_clients(db, args.segment, store_id=args.store, month=args.month,
+                                            within=args.within)
+        finally:
+            db.close()
+
+    if args.job:
+        total = campaigns.run_job(args.job, load_rows, args.format)
+        print(f"{total} arte(s) em {campaigns.zip_path(args.job)}")
+        return
+    rows = load_rows()
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\rartes: {done}/{total}", end="", flush=True)
+
+    total = campaigns.render_batch(rows, args.out, args.format, args.workers, progress)
+    print(f"\n{total} arte(s) em {args.out} ({time.perf_counter() - started:.1f}s)")
+
+
+def cmd_birthday_run(args):
+    db = SessionLocal()
+    try:
+        result = birthdays.run(db, days=args.days, store_id=args.store, dry_run=args.dry_run)
+        if not args.dry_run:
+            db.commit()
+            outbox.wake()
+    finally:
+        db.close()
+    if args.links:
+        with open(args.links, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f, delimiter=";")
+            w.writerow(["loja", "cliente", "aniversario", "whatsapp"])
+            for link in result["links"]:
+                w.writerow([link["store"], link["name"], link["birthday"], link["whatsapp_url"]])
+    prefix = "(simulação) " if args.dry_run else ""
+    dates = result["dates"][0] + (f" a {result['dates'][-1]}" if len(result["dates"]) > 1 else "")
+    print(f"{prefix}{dates}: {result['emails']} e-mail(s) na fila, "
+          f"{len(result['links'])} link(s) de WhatsApp" + (f" em {args.links}" if args.links else ""))
+
+
+def cmd_archive_cycles(args):
+    if args.older_than_days <= rollups.WINDOW_DAYS:
+        # o dashboard (rebuild-stats) e os exports ainda leem visitas dessa janela
+        sys.exit(f"--older-than-days deve ser maior que {rollups.WINDOW_DAYS}")
+    migrations.upgrade(engine, log=print)
+    db = SessionLocal()
+    try:
+        result = history.archive_cycles(db, args.older_than_days, args.batch, args.dry_run, log=print)
+    finally:
+        db.close()
+    prefix = "(simulação) " if args.dry_run else ""
+    print(f"{prefix}{result['cycles']} ciclo(s) arquivado(s), {result['visits']} visita(s) compactada(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.manage")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("migrate", help="aplica as migrações pendentes do schema")
+    p.add_argument("--status", action="store_true", help="só lista aplicadas/pendentes")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("reconcile-visits", help="backfill/reconcilia visits_balance e lifetime_visits")
+    p.set_defaults(func=cmd_reconcile_visits)
+
+    p = sub.add_parser("rebuild-stats", help="recria o rollup diário do dashboard (store_daily_stats)")
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = sub.add_parser("prune-idempotency", help="apaga Idempotency-Keys vencidas (rode no cron)")
+    p.set_defaults(func=cmd_prune_idempotency)
+
+    p = sub.add_parser("outbox-worker", help="drena a fila de e-mails (email_outbox)")
+    p.add_argument("--workers", type=int, default=max(1, outbox.EMAIL_WORKERS))
+    p.add_argument("--once", action="store_true", help="processa um lote e sai")
+    p.set_defaults(func=cmd_outbox_worker)
+
+    p = sub.add_parser("render-cards", help="gera as artes do WhatsApp de um segmento (zip ou diretório)")
+    p.add_argument("--segment", choices=campaigns.SEGMENTS, required=True)
+    p.add_argument("--month", type=int, help="mês dos aniversariantes (padrão: atual)")
+    p.add_argument("--within", type=int, default=2, help="perto-da-meta: faltam no máximo N visitas")
+    p.add_argument("--store", type=int, help="só clientes desta loja")
+    p.add_argument("--format", choices=sorted(campaigns.EXTENSIONS), help="padrão: CARD_FORMAT")
+    p.add_argument("--workers", type=int, help="processos (padrão: CARD_WORKERS ou nº de CPUs)")
+    out = p.add_mutually_exclusive_group(required=True)
+    out.add_argument("--out", help="arquivo .zip ou diretório de saída")
+    out.add_argument("--job", help=argparse.SUPPRESS)  # usado por POST /api/campanhas/artes
+    p.set_defaults(func=cmd_render_cards)
+
+    p = sub.add_parser("birthday-run", help="parabéns do dia/semana: e-mails no outbox + links de WhatsApp")
+    p.add_argument("--days", type=int, default=1, help="1 = hoje, 7 = hoje e os próximos 6 dias")
+    p.add_argument("--store", type=int, help="só clientes desta loja")
+    p.add_argument("--links", help="grava os links de WhatsApp neste .csv")
+    p.add_argument("--dry-run", action="store_true", help="só conta; não enfileira nem registra")
+    p.set_defaults(func=cmd_birthday_run)
+
+    p = sub.add_parser("archive-cycles", help="compacta as visitas de resgates antigos em archived_cycles")
+    p.add_argument("--older-than-days", type=int, default=365, help="resgates com mais de N dias")
+    p.add_argument("--batch", type=int, default=500, help="resgates por transação")
+    p.add_argument("--dry-run", action="store_true", help="só conta; não move nada")
+    p.set_defaults(func=cmd_archive_cycles)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
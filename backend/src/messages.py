@@ -0,0 +1,87 @@
+# messages.py — textos de WhatsApp (wa.me) compilados uma vez
+# Cada template é quebrado na importação em pedaços fixos já codificados para a URL
+# e campos variáveis; por cliente só nome/números passam pelo quote(). Gerar milhares
+# de links de um segmento fica no custo de um join de strings por linha.
+import os
+from string import Formatter
+from urllib.parse import quote
+
+GIFT_NAME = os.getenv("GIFT_NAME", "1 Kg de Vela Palito")
+SITE = "https://www.casadocigano.com.br/"
+
+
+def _quote(value) -> str:
+    return quote(str(value), safe="", encoding="utf-8")
+
+
+class WaTemplate:
+    """Texto com campos {nome}; `constants` são resolvidos já na compilação."""
+
+    def __init__(self, text: str, **constants):
+        self.text = text
+        self._parts: list[tuple[str, str | None]] = []  # (literal codificado, campo)
+        pending = ""
+        for literal, field, _, _ in Formatter().parse(text):
+            pending += literal
+            if field is None:
+                continue
+            if field in constants:
+                pending += str(constants[field])
+                continue
+            self._parts.append((_quote(pending), field))
+            pending = ""
+        self._tail = _quote(pending)
+
+    def encode(self, **fields) -> str:
+        """Texto já codificado para o parâmetro ?text= do wa.me."""
+        return "".join(lit + _quote(fields[f]) for lit, f in self._parts) + self._tail
+
+    def url(self, phone_wa: str, **fields) -> str:
+        return f"https://wa.me/{phone_wa}?text=" + self.encode(**fields)
+
+
+def first_name(name: str | None) -> str:
+    return ((name or "").split() or ["cliente"])[0]
+
+
+# sem emojis, com parágrafos
+_VISITA = (
+    "Oi, {nome}! Obrigado por confiar na Casa do Cigano.\n\n"
+    "Esperamos que você ame seu novo produto!\n\n"
+    "Você está participando do nosso programa de fidelidade *CiganoLovers* e você tem {visitas} visita(s).\n\n"
+)
+VISITA_ELEGIVEL = WaTemplate(
+    _VISITA + "Você JÁ PODE resgatar seu brinde: {brinde} (meta {meta} visitas).\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    brinde=GIFT_NAME, site=SITE,
+)
+VISITA_PROGRESSO = WaTemplate(
+    _VISITA + "Faltam {faltam} visita(s) para o brinde {brinde} (meta {meta} visitas).\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    brinde=GIFT_NAME, site=SITE,
+)
+ANIVERSARIO = WaTemplate(
+    "Oi, {nome}! Feliz aniversário!\n\n"
+    "A Casa do Cigano deseja um dia lindo para você. Passe na loja {loja} para comemorar com a gente.\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    site=SITE,
+)
+PERTO_DA_META = WaTemplate(
+    "Oi, {nome}! Sentimos sua falta na Casa do Cigano.\n\n"
+    "Você tem {visitas} visita(s) no programa *CiganoLovers* e faltam só {faltam} para ganhar {brinde}.\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    brinde=GIFT_NAME, site=SITE,
+)
+ELEGIVEL = WaTemplate(
+    "Oi, {nome}! Seu brinde está esperando por você na Casa do Cigano.\n\n"
+    "Você já completou {visitas} visita(s) no programa *CiganoLovers* e pode resgatar {brinde} "
+    "na sua próxima visita.\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    brinde=GIFT_NAME, site=SITE,
+)
+REENGAJAMENTO = WaTemplate(
+    "Oi, {nome}! Sentimos sua falta na Casa do Cigano.\n\n"
+    "Você tem {visitas} visita(s) no programa *CiganoLovers* (meta {meta} para ganhar {brinde}).\n\n"
+    "Confira as novidades em nossa loja: {site}",
+    brinde=GIFT_NAME, site=SITE,
+)
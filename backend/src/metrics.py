@@ -0,0 +1,198 @@
+# metrics.py — métricas em memória, expostas no formato texto do Prometheus (/api/_metrics)
+# Sem dependência externa. Cada processo (worker do gunicorn) tem os próprios números:
+# o Prometheus raspa cada worker/instância e soma na consulta.
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# segundos; cobre de consulta indexada (ms) a SMTP lento (s)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)  # consultas por requisição
+
+_registry: list = []
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = list(self._values.items())
+        for key, v in items:
+            out.append(f"{self.name}{_fmt_labels(self.labels, key)} {v}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values: dict[tuple, list] = {}  # key -> [contagem por bucket..., soma, total]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            for b, n in zip(self.buckets, row):
+                le = 'le="%s"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {n}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {row[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {row[-2]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {row[-1]}")
+        return out
+
+
+class Gauge:
+    """Valor lido na hora da raspagem: fn() devolve um número ou {labels: número}.
+
+    kind="counter" para totais que só crescem mantidos em outro lugar (pool, lru_cache).
+    """
+
+    def __init__(self, name: str, help: str, fn, labels: tuple = (), kind: str = "gauge"):
+        self.name, self.help, self.fn, self.labels, self.kind = name, help, fn, labels, kind
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, v in items:
+            key = key if isinstance(key, tuple) else (key,)
+            out.append(f"{self.name}{_fmt_labels(self.labels, key)} {v}")
+        return out
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# MÉTRICAS DA APLICAÇÃO
+# ======================================================
+
+http_latency = Histogram(
+    "http_request_duration_seconds", "Latência por rota", ("method", "route", "status"))
+http_db_queries = Histogram(
+    "http_request_db_queries", "Consultas SQL por requisição", ("route",), COUNT_BUCKETS)
+http_db_seconds = Histogram(
+    "http_request_db_seconds", "Tempo total em SQL por requisição", ("route",))
+db_queries = Counter("db_queries_total", "Consultas SQL executadas", ("engine",))
+db_query_seconds = Histogram("db_query_duration_seconds", "Latência de cada consulta SQL", ("engine",))
+steps = Histogram("app_step_duration_seconds", "Etapas internas dos endpoints", ("step",))
+smtp_send_seconds = Histogram("smtp_send_duration_seconds", "Envio de uma mensagem SMTP")
+smtp_connects = Counter("smtp_connects_total", "Conexões (handshake + login) SMTP abertas")
+smtp_failures = Counter("smtp_failures_total", "Falhas de envio SMTP", ("error",))
+card_render_seconds = Histogram("card_render_duration_seconds", "Renderização de arte (sem cache)", ("format",))
+
+
+class Stopwatch:
+    """Tempo entre marcas de um endpoint: sw = Stopwatch("visita"); ...; sw.lap("cliente")."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._last = time.perf_counter()
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        steps.observe(now - self._last, step=f"{self.prefix}.{name}")
+        self._last = now
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Conta/mede cada SQL do engine e acumula por requisição (flask.g)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["_metrics_started"].pop()
+        elapsed = time.perf_counter() - started
+        db_queries.inc(engine=name)
+        db_query_seconds.observe(elapsed, engine=name)
+        if has_request_context():
+            g._db_queries = g.get("_db_queries", 0) + 1
+            g._db_seconds = g.get("_db_seconds", 0.0) + elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        if ctx.connection is not None and ctx.connection.info.get("_metrics_started"):
+            ctx.connection.info["_metrics_started"].pop()
+
+
+def init_app(app) -> None:
+    """Mede latência por rota e as consultas de cada requisição."""
+
+    @app.before_request
+    def _start_timer():
+        g._started = time.perf_counter()
+
+    @app.after_request
+    def _observe(resp):
+        started = g.get("_started")
+        if started is not None:
+            route = request_route()
+            http_latency.observe(time.perf_counter() - started,
+                                 method=request.method, route=route, status=resp.status_code)
+            http_db_queries.observe(g.get("_db_queries", 0), route=route)
+            http_db_seconds.observe(g.get("_db_seconds", 0.0), route=route)
+        return resp
+
+
+def request_route() -> str:
+    # regra da rota (/api/clientes/<int:cid>), não a URL: cardinalidade fixa
+    return request.url_rule.rule if request.url_rule is not None else "sem_rota"
+
@@ -0,0 +1,239 @@
+# migrations.py — versionamento do schema (substitui o Base.metadata.create_all solto)
+# Cada migração roda uma única vez, em transação, e fica registrada em
+# schema_migrations. As migrações são idempotentes (checkfirst / "se não existir")
+# para funcionar tanto em banco novo quanto em bancos criados pelas versões antigas.
+#
+#   python -m src.manage migrate            aplica as pendentes
+#   python -m src.manage migrate --status   lista aplicadas/pendentes
+#
+# Nova migração: escreva uma função (conn) -> None e acrescente no FIM de MIGRATIONS.
+from datetime import datetime
+
+from sqlalchemy import (
+    Table, Column, String, DateTime, MetaData, select, insert, inspect, text, update, extract, case, func,
+)
+
+from .db import Base
+from . import models, rollups, search
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", String(64), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ======================================================
+# HELPERS
+# ======================================================
+
+def _add_column_if_missing(conn, table: str, column: str, ddl: str) -> None:
+    cols = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in cols:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_table(conn, model) -> None:
+    model.__table__.create(conn, checkfirst=True)
+
+
+def _create_indexes(conn, model, *names: str) -> None:
+    """Cria os índices do model pelo nome. Sempre liste os nomes: o model reflete o
+    schema ATUAL e pode ter índices de colunas que só migrações posteriores criam."""
+    by_name = {ix.name: ix for ix in model.__table__.indexes}
+    for name in names:
+        by_name[name].create(conn, checkfirst=True)
+
+
+# ======================================================
+# MIGRAÇÕES
+# ======================================================
+
+def m0001_baseline(conn):
+    # tabelas que ainda não existirem (banco novo já sai com o schema atual)
+    Base.metadata.create_all(bind=conn)
+
+
+def m0002_client_counters(conn):
+    _add_column_if_missing(conn, "clients", "visits_balance", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(conn, "clients", "lifetime_visits", "INTEGER NOT NULL DEFAULT 0")
+    # antes o resgate apagava as visitas: as que restam são o saldo (e o melhor palpite
+    # do total). Só colunas que já existiam aqui; o vínculo com resgates vem na 0008.
+    c, v = models.Client, models.Visit
+    visits = select(func.count(v.id)).where(v.client_id == c.id).scalar_subquery()
+    conn.execute(update(c).values(visits_balance=visits, lifetime_visits=visits))
+
+
+def m0003_outbox_and_rollups(conn):
+    _create_table(conn, models.EmailOutbox)
+    _create_indexes(conn, models.EmailOutbox, "ix_email_outbox_due")
+    _create_table(conn, models.StoreDailyStats)
+    rollups.rebuild(conn)  # dashboard já sai com o histórico existente
+
+
+def m0004_hot_path_indexes(conn):
+    _add_column_if_missing(conn, "clients", "birth_month", "SMALLINT")
+    _add_column_if_missing(conn, "clients", "birth_day", "SMALLINT")
+    c = models.Client
+    conn.execute(
+        update(c)
+        .where(c.birthday.is_not(None), c.birth_month.is_(None))
+        .values(birth_month=extract("month", c.birthday), birth_day=extract("day", c.birthday))
+    )
+    _create_indexes(conn, models.Client, "ix_clients_birth", "ix_clients_store_birth")
+    _create_indexes(conn, models.Visit, "ix_visits_client_created", "ix_visits_store_created")
+    _create_indexes(conn, models.Redemption, "ix_redemptions_client_created", "ix_redemptions_store_created")
+    # índices de (store_id, created_at) / (created_at) do cliente: ver 0005
+
+
+def m0005_client_keyset_indexes(conn):
+    # paginação por cursor ordena por (created_at, id): índices passam a incluir o id
+    _create_indexes(conn, models.Client, "ix_clients_store_created_id", "ix_clients_created_id")
+    conn.execute(text("DROP INDEX IF EXISTS ix_clients_store_created"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_clients_created"))
+
+
+def m0006_client_search(conn):
+    for column in ("cpf_digits", "phone_digits"):
+        _add_column_if_missing(conn, "clients", column, "VARCHAR(30)")
+    _add_column_if_missing(conn, "clients", "name_norm", "VARCHAR(120)")
+    # backfill em lotes (a normalização de acentos é feita em Python)
+    c = models.Client
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(c.id, c.name, c.cpf, c.phone)
+            .where(c.id > last_id, c.name_norm.is_(None))
+            .order_by(c.id)
+            .limit(1000)
+        ).all()
+        if not rows:
+            break
+        for r in rows:
+            d = c.derived(name=r.name, cpf=r.cpf, phone=r.phone)
+            conn.execute(
+                update(c)
+                .where(c.id == r.id)
+                .values(name_norm=d["name_norm"], cpf_digits=d["cpf_digits"], phone_digits=d["phone_digits"])
+            )
+        last_id = rows[-1].id
+    _create_indexes(conn, models.Client, "ix_clients_cpf_digits", "ix_clients_phone_digits")
+    if conn.dialect.name == "sqlite":
+        search.create_sqlite_fts(conn)
+    elif conn.dialect.name == "postgresql":
+        search.create_pg_trgm(conn)
+
+
+def m0007_idempotency_keys(conn):
+    _create_table(conn, models.IdempotencyKey)
+    _create_indexes(conn, models.IdempotencyKey, "ix_idempotency_created")
+
+
+def m0008_visit_redemption_link(conn):
+    _add_column_if_missing(conn, "visits", "redemption_id", "INTEGER REFERENCES redemptions(id)")
+    # antes o resgate zerava o saldo: cada visita foi consumida pelo primeiro resgate
+    # do cliente feito depois dela (as posteriores ao último resgate seguem no saldo)
+    v, r = models.Visit, models.Redemption
+    first_redemption = (
+        select(r.id)
+        .where(r.client_id == v.client_id, r.created_at >= v.created_at)
+        .order_by(r.created_at, r.id)
+        .limit(1)
+        .correlate(v)
+        .scalar_subquery()
+    )
+    conn.execute(update(v).where(v.redemption_id.is_(None)).values(redemption_id=first_redemption))
+    _create_indexes(conn, models.Visit, "ix_visits_redemption")
+
+
+def m0009_sync_uuids(conn):
+    _add_column_if_missing(conn, "visits", "uuid", "VARCHAR(36)")
+    _add_column_if_missing(conn, "redemptions", "uuid", "VARCHAR(36)")
+    _create_indexes(conn, models.Visit, "ux_visits_uuid")
+    _create_indexes(conn, models.Redemption, "ux_redemptions_uuid")
+
+
+def m0010_birthday_sends(conn):
+    _create_table(conn, models.BirthdaySend)
+
+
+def m0011_client_phone_wa(conn):
+    _add_column_if_missing(conn, "clients", "phone_wa", "VARCHAR(20)")
+    # mesma regra de util.format_phone_to_wa, em SQL a partir de phone_digits
+    c = models.Client
+    conn.execute(
+        update(c)
+        .where(c.phone_digits.is_not(None), func.length(c.phone_digits) >= 10)
+        .values(phone_wa=case((c.phone_digits.startswith("55"), c.phone_digits), else_="55" + c.phone_digits))
+    )
+
+
+def m0012_archived_cycles(conn):
+    _create_table(conn, models.ArchivedCycle)
+    _create_indexes(conn, models.ArchivedCycle, "ix_archived_cycles_client")
+
+
+def _add_config_version(conn, name: str) -> None:
+    table = models.ConfigVersion.__table__
+    if conn.execute(select(table.c.name).where(table.c.name == name)).first() is None:
+        conn.execute(insert(table).values(name=name, version=1))
+
+
+def m0013_config_versions(conn):
+    _create_table(conn, models.ConfigVersion)
+    _add_config_version(conn, "stores")
+
+
+def m0014_users_version(conn):
+    _add_config_version(conn, "users")
+
+
+MIGRATIONS = [
+    ("0001_baseline", m0001_baseline),
+    ("0002_client_counters", m0002_client_counters),
+    ("0003_outbox_and_rollups", m0003_outbox_and_rollups),
+    ("0004_hot_path_indexes", m0004_hot_path_indexes),
+    ("0005_client_keyset_indexes", m0005_client_keyset_indexes),
+    ("0006_client_search", m0006_client_search),
+    ("0007_idempotency_keys", m0007_idempotency_keys),
+    ("0008_visit_redemption_link", m0008_visit_redemption_link),
+    ("0009_sync_uuids", m0009_sync_uuids),
+    ("0010_birthday_sends", m0010_birthday_sends),
+    ("0011_client_phone_wa", m0011_client_phone_wa),
+    ("0012_archived_cycles", m0012_archived_cycles),
+    ("0013_config_versions", m0013_config_versions),
+    ("0014_users_version", m0014_users_version),
+]
+
+
+# ======================================================
+# RUNNER
+# ======================================================
+
+def applied_versions(engine) -> set[str]:
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine) -> list[str]:
+    done = applied_versions(engine)
+    return [v for v, _ in MIGRATIONS if v not in done]
+
+
+def upgrade(engine, log=None) -> list[str]:
+    """Aplica as migrações pendentes, cada uma na sua transação."""
+    done = applied_versions(engine)
+    applied = []
+    for version, fn in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(insert(schema_migrations).values(version=version, applied_at=datetime.utcnow()))
+        applied.append(version)
+        if log:
+            log(f"migração aplicada: {version}")
+    return applied
@@ -1,7 +1,8 @@
-from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from datetime import datetime
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Date, Boolean, ForeignKey, Text, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
 from .db import Base
+from .util import only_digits, fold_name, format_phone_to_wa
 
 class Store(Base):
     __tablename__ = "stores"
@@ -34,20 +35,80 @@ class Client(Base):
     birthday = Column(Date, nullable=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # contadores mantidos junto com o insert da visita (evita COUNT(*) por requisição)
+    visits_balance = Column(Integer, nullable=False, default=0, server_default="0")  # saldo p/ brinde
+    lifetime_visits = Column(Integer, nullable=False, default=0, server_default="0")  # total histórico
+    # derivados de birthday (indexáveis; evita extract(month) linha a linha)
+    birth_month = Column(SmallInteger, nullable=True)
+    birth_day = Column(SmallInteger, nullable=True)
+    # normalizados para busca (só dígitos / nome sem acento em minúsculas)
+    cpf_digits = Column(String(20), nullable=True)
+    phone_digits = Column(String(30), nullable=True)
+    name_norm = Column(String(120), nullable=True)
+    # telefone no formato do wa.me (DDI 55); NULL = sem WhatsApp válido
+    phone_wa = Column(String(20), nullable=True)
 
     store = relationship("Store", back_populates="clients")
     visits = relationship("Visit", back_populates="client")
     redemptions = relationship("Redemption", back_populates="client")
 
+    __table_args__ = (
+        Index("ix_clients_store_created_id", "store_id", "created_at", "id"),
+        Index("ix_clients_created_id", "created_at", "id"),
+        Index("ix_clients_birth", "birth_month", "birth_day"),
+        Index("ix_clients_store_birth", "store_id", "birth_month", "birth_day"),
+        Index("ix_clients_cpf_digits", "cpf_digits"),
+        Index("ix_clients_phone_digits", "phone_digits"),
+    )
+
+    @staticmethod
+    def derived(name=None, cpf=None, phone=None, birthday=None) -> dict:
+        """Colunas derivadas, para inserts em lote que não passam pelo ORM."""
+        return {
+            "name_norm": fold_name(name) or None,
+            "cpf_digits": only_digits(cpf) or None,
+            "phone_digits": only_digits(phone) or None,
+            "phone_wa": format_phone_to_wa(phone),
+            "birth_month": birthday.month if birthday else None,
+            "birth_day": birthday.day if birthday else None,
+        }
+
+    @validates("birthday")
+    def _sync_birth_parts(self, key, value):
+        self.birth_month = value.month if value else None
+        self.birth_day = value.day if value else None
+        return value
+
+    @validates("name", "cpf", "phone")
+    def _sync_search_columns(self, key, value):
+        if key == "name":
+            self.name_norm = fold_name(value) or None
+        else:
+            setattr(self, f"{key}_digits", only_digits(value) or None)
+            if key == "phone":
+                self.phone_wa = format_phone_to_wa(value)
+        return value
+
 class Visit(Base):
     __tablename__ = "visits"
     id = Column(Integer, primary_key=True)
     client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # resgate que consumiu esta visita (NULL = ainda conta no saldo)
+    redemption_id = Column(Integer, ForeignKey("redemptions.id"), nullable=True)
+    # UUID gerado pelo terminal (visitas enviadas por /api/sync); NULL nas online
+    uuid = Column(String(36), nullable=True)
 
     client = relationship("Client", back_populates="visits")
 
+    __table_args__ = (
+        Index("ix_visits_client_created", "client_id", "created_at"),
+        Index("ix_visits_store_created", "store_id", "created_at"),
+        Index("ix_visits_redemption", "redemption_id"),
+        Index("ux_visits_uuid", "uuid", unique=True),
+    )
+
 class Redemption(Base):
     __tablename__ = "redemptions"
     id = Column(Integer, primary_key=True)
@@ -55,5 +116,96 @@ class Redemption(Base):
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
     gift_name = Column(String(120), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    uuid = Column(String(36), nullable=True)  # UUID do terminal (/api/sync)
 
     client = relationship("Client", back_populates="redemptions")
+
+    __table_args__ = (
+        Index("ix_redemptions_client_created", "client_id", "created_at"),
+        Index("ix_redemptions_store_created", "store_id", "created_at"),
+        Index("ux_redemptions_uuid", "uuid", unique=True),
+    )
+
+class StoreDailyStats(Base):
+    """Rollup diário por loja, incrementado junto com visitas/resgates/cadastros.
+    store_id = 0 agrupa clientes cadastrados sem loja."""
+    __tablename__ = "store_daily_stats"
+    store_id = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+    visits = Column(Integer, nullable=False, default=0)
+    redemptions = Column(Integer, nullable=False, default=0)
+    new_clients = Column(Integer, nullable=False, default=0)
+
+class EmailOutbox(Base):
+    """Fila persistida de e-mails; gravada na transação da visita e drenada por workers."""
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body_text = Column(Text, nullable=False)
+    body_html = Column(Text, nullable=True)
+    status = Column(String(20), nullable=False, default="PENDENTE")  # PENDENTE/ENVIADO/FALHOU
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+
+
+class IdempotencyKey(Base):
+    """Resposta gravada por (usuário, Idempotency-Key), na mesma transação da escrita."""
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    key = Column(String(128), nullable=False)
+    endpoint = Column(String(80), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # sha256 do corpo da requisição
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+        Index("ix_idempotency_created", "created_at"),
+    )
+
+
+class BirthdaySend(Base):
+    """Parabéns já enviado por (cliente, ano, canal); a campanha diária não repete."""
+    __tablename__ = "birthday_sends"
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    store_id = Column(Integer, nullable=True)
+    year = Column(SmallInteger, nullable=False)
+    channel = Column(String(20), nullable=False)  # email / whatsapp
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("client_id", "year", "channel", name="uq_birthday_send"),
+    )
+
+
+class ArchivedCycle(Base):
+    """Visitas de um ciclo já resgatado, compactadas por loja (manage archive-cycles).
+    As linhas de visits do ciclo são apagadas; o resgate continua em redemptions."""
+    __tablename__ = "archived_cycles"
+    redemption_id = Column(Integer, ForeignKey("redemptions.id"), primary_key=True, autoincrement=False)
+    store_id = Column(Integer, primary_key=True, autoincrement=False)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    visits = Column(Integer, nullable=False)
+    first_visit_at = Column(DateTime, nullable=True)
+    last_visit_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_archived_cycles_client", "client_id"),
+    )
+
+
+class ConfigVersion(Base):
+    """Versão de uma configuração cacheada em memória (ex.: "stores"); quem edita
+    incrementa e os processos recarregam ao ver o número novo."""
+    __tablename__ = "config_versions"
+    name = Column(String(40), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
@@ -0,0 +1,196 @@
+# outbox.py — envio assíncrono de e-mails (nada de SMTP dentro da requisição)
+# A requisição só grava uma linha em email_outbox (na mesma transação da visita);
+# um pool de threads drena a fila com retentativas e backoff exponencial.
+#
+# Env:
+#   EMAIL_WORKERS            threads por processo web (0 = não drena no web; use
+#                            `python -m src.manage outbox-worker` num processo separado)
+#   EMAIL_POLL_SECONDS       intervalo de varredura quando a fila está vazia
+#   EMAIL_MAX_ATTEMPTS       tentativas antes de marcar FALHOU
+#   EMAIL_BACKOFF_SECONDS    base do backoff (base * 2^tentativas, com jitter)
+#   EMAIL_BACKOFF_MAX        teto do backoff
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, func
+
+from .db import Session, SessionLocal
+from .models import EmailOutbox
+from . import emailer
+
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+BACKOFF_SECONDS = float(os.getenv("EMAIL_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX", "3600"))
+BATCH_SIZE = 20
+
+
+def _lease_seconds(n: int) -> float:
+    """Quanto um worker "segura" um lote de n mensagens: o pior caso de cada envio
+    (send + reconexão + novo send, cada um até SMTP_TIMEOUT) mais a espera do
+    rate limit dividido com as outras threads, e uma folga. Lease curto demais faz
+    outro worker pegar a mensagem ainda em envio (e-mail em dobro)."""
+    per_message = 3 * emailer.SMTP_TIMEOUT
+    if emailer.SMTP_RATE_PER_SEC > 0:
+        per_message += max(1, EMAIL_WORKERS) / emailer.SMTP_RATE_PER_SEC
+    return n * per_message + 30
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: list[threading.Thread] = []
+
+
+def enqueue_email(db, to_email: str, subject: str, text: str, html: str | None = None) -> EmailOutbox | None:
+    """Grava o e-mail na fila. Não faz commit: entra na transação de quem chamou.
+    Sem SMTP configurado não grava nada (ninguém drenaria a fila)."""
+    if not emailer.is_configured():
+        return None
+    item = EmailOutbox(to_email=to_email, subject=subject, body_text=text, body_html=html)
+    db.add(item)
+    return item
+
+
+def wake() -> None:
+    """Acorda os workers (chamar depois do commit)."""
+    _wake.set()
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim(db, limit: int) -> tuple[list[EmailOutbox], datetime]:
+    """Reserva mensagens vencidas. O UPDATE condicional funciona como lease:
+    só um worker (thread ou processo) consegue mover next_attempt_at de cada linha,
+    e se ele morrer a mensagem volta a vencer depois de _lease_seconds(lote).
+    Devolve as mensagens e o lease (next_attempt_at gravado nelas)."""
+    now = datetime.utcnow()
+    candidates = db.execute(
+        select(EmailOutbox.id, EmailOutbox.next_attempt_at)
+        .where(EmailOutbox.status == "PENDENTE", EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at.asc())
+        .limit(limit)
+    ).all()
+    lease = now + timedelta(seconds=_lease_seconds(len(candidates)))
+    claimed = []
+    for oid, due in candidates:
+        res = db.execute(
+            update(EmailOutbox)
+            .where(
+                EmailOutbox.id == oid,
+                EmailOutbox.status == "PENDENTE",
+                EmailOutbox.next_attempt_at == due,
+            )
+            .values(next_attempt_at=lease)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount == 1:
+            claimed.append(oid)
+    db.commit()
+    if not claimed:
+        return [], lease
+    return db.execute(select(EmailOutbox).where(EmailOutbox.id.in_(claimed))).scalars().all(), lease
+
+
+def _mark(db, item: EmailOutbox, lease: datetime, error: Exception | None) -> bool:
+    """Grava o resultado só se o lease ainda é deste worker (next_attempt_at == lease).
+    False = o lease venceu e outro worker pegou a mensagem; nada é alterado."""
+    attempts = (item.attempts or 0) + 1
+    values = {"attempts": attempts}
+    if error is None:
+        values.update(status="ENVIADO", sent_at=datetime.utcnow(), last_error=None)
+    else:
+        values["last_error"] = str(error)[:500]
+        if attempts >= MAX_ATTEMPTS:
+            values["status"] = "FALHOU"
+        else:
+            values["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=_backoff(attempts))
+    res = db.execute(
+        update(EmailOutbox)
+        .where(
+            EmailOutbox.id == item.id,
+            EmailOutbox.status == "PENDENTE",
+            EmailOutbox.next_attempt_at == lease,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if res.rowcount != 1:
+        print(f"OUTBOX: lease da mensagem {item.id} venceu durante o envio")
+        return False
+    return True
+
+
+def pending_count() -> int:
+    """Tamanho da fila (para /api/_metrics)."""
+    db = Session()
+    try:
+        return db.execute(
+            select(func.count(EmailOutbox.id)).where(EmailOutbox.status == "PENDENTE")
+        ).scalar() or 0
+    finally:
+        db.close()
+
+
+def drain_once(limit: int = BATCH_SIZE) -> int:
+    """Envia um lote de mensagens vencidas. Retorna quantas foram processadas."""
+    if not emailer.is_configured():
+        return 0
+    db = SessionLocal()
+    try:
+        items, lease = _claim(db, limit)
+        if not items:
+            return 0
+        # o lote inteiro sai por uma única conexão do pool
+        with emailer.pool.session() as smtp:
+            for item in items:
+                if datetime.utcnow() >= lease:
+                    break  # o resto do lote já pode estar com outro worker
+                try:
+                    smtp.send(
+                        emailer.build_message(item.to_email, item.subject, item.body_text, item.body_html)
+                    )
+                    _mark(db, item, lease, None)
+                except Exception as e:
+                    print("EMAIL ERROR:", e)
+                    _mark(db, item, lease, e)
+        return len(items)
+    finally:
+        db.close()
+        SessionLocal.remove()
+
+
+def _run() -> None:
+    while not _stop.is_set():
+        try:
+            processed = drain_once()
+        except Exception as e:  # banco fora do ar etc.; tenta de novo no próximo ciclo
+            print("OUTBOX ERROR:", e)
+            processed = 0
+        if processed:
+            continue
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start_workers(n: int = EMAIL_WORKERS) -> None:
+    """Sobe n threads daemon drenando a fila (idempotente por processo)."""
+    alive = [t for t in _threads if t.is_alive()]
+    for i in range(len(alive), n):
+        t = threading.Thread(target=_run, name=f"email-outbox-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def stop_workers(timeout: float | None = None) -> None:
+    _stop.set()
+    _wake.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
+    _stop.clear()
@@ -0,0 +1,41 @@
+# pagination.py — paginação por cursor (keyset)
+# O cursor é opaco para o frontend: base64url de um JSON com os valores da
+# última linha da página, na ordem das colunas de ordenação.
+import base64
+import json
+from datetime import datetime
+
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clamp_per_page(value, default: int = 10) -> int:
+    try:
+        n = int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        n = default
+    return max(1, min(MAX_PER_PAGE, n))
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, *types) -> tuple:
+    """Decodifica e converte cada valor (datetime/int/str) na ordem de `types`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor(token)
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)
+        )
+    except InvalidCursor:
+        raise
+    except Exception as e:
+        raise InvalidCursor(token) from e
@@ -0,0 +1,78 @@
+# passwords.py — hash de senha configurável, com rehash no login e verificação num pool
+# O primeiro esquema de PASSWORD_SCHEMES é o usado em hashes novos; os demais só são
+# aceitos e, no próximo login certo, o hash é refeito no esquema/rounds atuais
+# (CryptContext.verify_and_update). A verificação (PBKDF2, CPU) roda num pool limitado
+# de threads de verdade: uma rajada de logins no início do turno ocupa no máximo
+# PASSWORD_THREADS núcleos, e as threads/greenlets do worker seguem atendendo o resto.
+#
+# Env:
+#   PASSWORD_SCHEMES   ex.: "pbkdf2_sha256" (padrão) ou "argon2,pbkdf2_sha256"
+#   PASSWORD_ROUNDS    rounds do esquema padrão (0 = padrão do passlib); hashes com
+#                      outro valor são refeitos no login
+#   PASSWORD_THREADS   verificações simultâneas por processo (padrão: núcleos)
+#   PASSWORD_TIMEOUT   segundos esperando vaga no pool antes de desistir (503)
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from passlib.context import CryptContext
+
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", "pbkdf2_sha256").split(",") if s.strip()]
+PASSWORD_ROUNDS = int(os.getenv("PASSWORD_ROUNDS", "0"))
+PASSWORD_THREADS = int(os.getenv("PASSWORD_THREADS", str(os.cpu_count() or 2)))
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", "10"))
+
+
+class PasswordBusy(Exception):
+    """Pool de verificação lotado por mais de PASSWORD_TIMEOUT."""
+
+
+def _context() -> CryptContext:
+    kwargs = {}
+    if PASSWORD_ROUNDS:
+        default = PASSWORD_SCHEMES[0]
+        # min = max = padrão: qualquer hash com outros rounds conta como desatualizado
+        for key in ("default_rounds", "min_rounds", "max_rounds"):
+            kwargs[f"{default}__{key}"] = PASSWORD_ROUNDS
+    return CryptContext(schemes=PASSWORD_SCHEMES, deprecated="auto", **kwargs)
+
+
+pwd_context = _context()
+_pool = None
+
+
+def _executor():
+    # sob gevent as threads do `threading` viram greenlets e o PBKDF2 travaria o hub;
+    # o pool do gevent usa threads nativas
+    global _pool
+    if _pool is None:
+        try:
+            from gevent import monkey
+
+            patched = monkey.is_module_patched("threading")
+        except ImportError:
+            patched = False
+        if patched:
+            from gevent.threadpool import ThreadPoolExecutor as GeventExecutor
+
+            _pool = GeventExecutor(max_workers=PASSWORD_THREADS)
+        else:
+            _pool = ThreadPoolExecutor(max_workers=PASSWORD_THREADS, thread_name_prefix="password")
+    return _pool
+
+
+def hash_password(p: str) -> str:
+    return pwd_context.hash(p)
+
+
+def verify_password(p: str, hashed: str) -> bool:
+    return pwd_context.verify(p, hashed)
+
+
+def verify_and_update(p: str, hashed: str) -> tuple[bool, str | None]:
+    """(senha confere, novo hash se o atual estiver desatualizado), rodando no pool."""
+    future = _executor().submit(pwd_context.verify_and_update, p, hashed)
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()
+        raise PasswordBusy() from None
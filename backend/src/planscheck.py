@@ -0,0 +1,146 @@
+# planscheck.py — garante que os endpoints principais não fazem full scan
+# Sobe um banco descartável (SQLite temporário por padrão, ou --database-url para
+# um Postgres de teste), popula com dados sintéticos, chama os endpoints pelo
+# test client do Flask, captura cada SQL executado e roda EXPLAIN nele.
+# Sai com código 1 se alguma consulta varrer uma tabela grande sequencialmente.
+#
+#   python -m src.planscheck --clients 50000 --visits 200000
+#   python -m src.planscheck --database-url postgresql://localhost/fidelidade_plans
+import argparse
+import json
+import re
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from . import harness
+
+BIG_TABLES = {"clients", "visits", "redemptions", "email_outbox", "idempotency_keys", "birthday_sends",
+              "archived_cycles"}
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+
+
+def _sqlite_full_scans(conn, statement, params):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).all()
+    found = []
+    for row in rows:
+        m = _SQLITE_SCAN.match(row[-1])
+        if m and m.group(1) in BIG_TABLES and "INDEX" not in m.group(2):
+            found.append(row[-1])
+    return found
+
+
+def _pg_full_scans(conn, statement, params):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    found = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in BIG_TABLES:
+            found.append(f"Seq Scan on {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return found
+
+
+def run(clients: int, visits: int) -> int:
+    _, http = harness.seeded_client()
+    from sqlalchemy import event, select
+    from .db import engine, SessionLocal
+    from .models import Store, Client
+    from . import rollups
+
+    harness.populate(clients, visits)
+    db = SessionLocal()
+    mascote = db.execute(select(Store).where(Store.name == "Mascote")).scalar_one()
+    cliente = db.execute(
+        select(Client).where(Client.store_id == mascote.id).order_by(Client.visits_balance.desc()).limit(1)
+    ).scalar_one()
+    cpf, cid = cliente.cpf, cliente.id
+    db.close()
+
+    admin = harness.auth_headers(http, "admin@cdc.com")
+    gerente = harness.auth_headers(http, "gerente.mascote@cdc.com")
+    calls = [
+        ("POST /api/visitas", lambda: http.post("/api/visitas", json={"cpf": cpf}, headers=gerente)),
+        # dentro do cooldown: cobre a busca da chave e a checagem de visita recente (409)
+        ("POST /api/visitas (Idempotency-Key)", lambda: http.post(
+            "/api/visitas", json={"cpf": cpf}, headers={**gerente, "Idempotency-Key": "planscheck"})),
+        ("POST /api/resgates", lambda: http.post("/api/resgates", json={"cpf": cpf}, headers=gerente)),
+        ("POST /api/sync", lambda: http.post("/api/sync", headers=gerente, json={"ops": [
+            {"uuid": str(uuid.uuid4()), "type": "visita", "cpf": cpf,
+             "at": (datetime.utcnow() - timedelta(hours=2)).isoformat()},
+            {"uuid": str(uuid.uuid4()), "type": "resgate", "cpf": cpf, "at": datetime.utcnow().isoformat()},
+        ]})),
+        ("GET /api/clientes (loja)", lambda: http.get("/api/clientes?page=3", headers=gerente)),
+        ("GET /api/clientes cursor (loja)", lambda: http.get(
+            "/api/clientes?cursor=" + (http.get("/api/clientes?cursor=&per_page=50", headers=gerente)
+                                       .json["next_cursor"] or ""), headers=gerente)),
+        ("GET /api/clientes cursor (todas)", lambda: http.get("/api/clientes?cursor=", headers=admin)),
+        ("GET /api/clientes?cpf", lambda: http.get(f"/api/clientes?cpf={cpf}", headers=admin)),
+        ("GET /api/clientes/busca (nome)", lambda: http.get("/api/clientes/busca?q=maria sil", headers=gerente)),
+        ("GET /api/clientes/busca (cpf)", lambda: http.get(f"/api/clientes/busca?q={cpf[:6]}", headers=gerente)),
+        ("GET /api/clientes/busca (telefone)", lambda: http.get("/api/clientes/busca?q=11 9123", headers=gerente)),
+        ("GET /api/clientes/<id>/historico", lambda: http.get(f"/api/clientes/{cid}/historico", headers=gerente)),
+        ("GET /api/clientes/<id>/extrato", lambda: http.get(
+            f"/api/clientes/{cid}/extrato?per_page=5&cursor="
+            + (http.get(f"/api/clientes/{cid}/extrato?per_page=5", headers=gerente).json["next_cursor"] or ""),
+            headers=gerente)),
+        ("GET /api/dashboard/kpis (loja)", lambda: http.get("/api/dashboard/kpis", headers=gerente)),
+        ("GET /api/dashboard/kpis (todas)", lambda: http.get("/api/dashboard/kpis", headers=admin)),
+        ("GET /api/dashboard/aniversariantes (loja)",
+         lambda: http.get("/api/dashboard/aniversariantes", headers=gerente)),
+        ("GET /api/dashboard/aniversariantes (todas)",
+         lambda: http.get("/api/dashboard/aniversariantes", headers=admin)),
+        ("GET /api/campanhas/aniversarios (loja, semana)",
+         lambda: http.get("/api/campanhas/aniversarios?dias=7", headers=gerente)),
+        ("POST /api/campanhas/aniversarios (todas, hoje)",
+         lambda: http.post("/api/campanhas/aniversarios", json={}, headers=admin)),
+    ]
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            captured.append((statement, parameters))
+
+    explain = _pg_full_scans if engine.dialect.name == "postgresql" else _sqlite_full_scans
+    failures = 0
+    for label, call in calls:
+        rollups.kpis_cache.clear()
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            resp = call()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        problems = []
+        with engine.connect() as conn:
+            for statement, params in captured:
+                for scan in explain(conn, statement, params):
+                    problems.append((scan, " ".join(statement.split())[:160]))
+        status = "OK  " if not problems else "FULL"
+        print(f"{status} {label} [{resp.status_code}] {len(captured)} consulta(s)")
+        for scan, sql in problems:
+            print(f"       {scan}: {sql}")
+        failures += len(problems)
+
+    print("sem full scans" if not failures else f"{failures} full scan(s) encontrados")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.planscheck")
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--visits", type=int, default=100000)
+    harness.add_database_arg(parser)
+    args = parser.parse_args(argv)
+    harness.use_disposable_db(args.database_url, "plans")
+    return run(args.clients, args.visits)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
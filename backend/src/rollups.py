@@ -0,0 +1,105 @@
+# rollups.py — KPIs do dashboard a partir do rollup diário por loja
+# Cada visita/resgate/cadastro faz um upsert (+1) em store_daily_stats na mesma
+# transação; o dashboard soma no máximo 31 linhas por loja em vez de varrer o histórico.
+#
+# Env:
+#   KPIS_CACHE_TTL  segundos de cache da resposta de /api/dashboard/kpis (0 = sem cache)
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, date
+
+from sqlalchemy import select, update, delete, insert, func
+
+from .models import StoreDailyStats, Client, Visit, Redemption
+from .util import TTLCache
+
+NO_STORE = 0  # clientes sem loja
+KPIS_CACHE_TTL = float(os.getenv("KPIS_CACHE_TTL", "15"))
+WINDOW_DAYS = 30
+
+kpis_cache = TTLCache(KPIS_CACHE_TTL, 64)
+
+
+def _upsert_insert(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def bump(db, store_id: int | None, *, visits: int = 0, redemptions: int = 0,
+         new_clients: int = 0, day: date | None = None) -> None:
+    """Incrementa o rollup do dia. Não faz commit (entra na transação do chamador)."""
+    sid = store_id or NO_STORE
+    day = day or datetime.utcnow().date()
+    deltas = {"visits": visits, "redemptions": redemptions, "new_clients": new_clients}
+    dialect_insert = _upsert_insert(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(StoreDailyStats).values(store_id=sid, day=day, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StoreDailyStats.store_id, StoreDailyStats.day],
+            set_={k: getattr(StoreDailyStats, k) + stmt.excluded[k] for k in deltas},
+        )
+        db.execute(stmt)
+        return
+    # outros bancos: UPDATE e, se não havia linha, INSERT
+    res = db.execute(
+        update(StoreDailyStats)
+        .where(StoreDailyStats.store_id == sid, StoreDailyStats.day == day)
+        .values({k: getattr(StoreDailyStats, k) + v for k, v in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if not res.rowcount:
+        db.execute(insert(StoreDailyStats).values(store_id=sid, day=day, **deltas))
+
+
+def kpis(db, store_id: int | None) -> dict:
+    """KPIs do dashboard; store_id=None = todas as lojas."""
+    since = (datetime.utcnow() - timedelta(days=WINDOW_DAYS)).date()
+    recent = select(
+        func.coalesce(func.sum(StoreDailyStats.visits), 0),
+        func.coalesce(func.sum(StoreDailyStats.redemptions), 0),
+    ).where(StoreDailyStats.day >= since)
+    total = select(func.coalesce(func.sum(StoreDailyStats.new_clients), 0))
+    if store_id:
+        recent = recent.where(StoreDailyStats.store_id == store_id)
+        total = total.where(StoreDailyStats.store_id == store_id)
+    visits_30, redemptions_30 = db.execute(recent).one()
+    clients_total = db.execute(total).scalar_one()
+    return {
+        "visitas_30d": int(visits_30),
+        "clientes_total": int(clients_total),
+        "resgates_30d": int(redemptions_30),
+    }
+
+
+def cached_kpis(db, store_id: int | None) -> dict:
+    key = store_id or None
+    data = kpis_cache.get(key)
+    if data is None:
+        data = kpis(db, store_id)
+        kpis_cache.set(key, data)
+    return data
+
+
+def rebuild(db) -> int:
+    """Recria store_daily_stats a partir de visits/redemptions/clients. Não faz commit."""
+    acc = defaultdict(lambda: {"visits": 0, "redemptions": 0, "new_clients": 0})
+    for model, field in ((Visit, "visits"), (Redemption, "redemptions"), (Client, "new_clients")):
+        day = func.date(model.created_at)
+        q = select(model.store_id, day, func.count(model.id)).group_by(model.store_id, day)
+        for sid, d, n in db.execute(q):
+            if d is None:
+                continue
+            if isinstance(d, str):  # SQLite devolve texto
+                d = date.fromisoformat(d)
+            acc[(sid or NO_STORE, d)][field] += n
+    db.execute(delete(StoreDailyStats))
+    rows = [{"store_id": sid, "day": d, **v} for (sid, d), v in acc.items()]
+    if rows:
+        db.execute(insert(StoreDailyStats), rows)
+    kpis_cache.clear()
+    return len(rows)
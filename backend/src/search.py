@@ -0,0 +1,156 @@
+# search.py — busca de clientes (type-ahead) por nome, CPF ou telefone
+# Usa as colunas normalizadas de Client (name_norm, cpf_digits, phone_digits):
+#   - CPF/telefone: prefixo por faixa (>= 'abc' AND < 'abd') em índice btree comum
+#   - nome no Postgres: índice trigram (pg_trgm) + similarity() para ordenar
+#   - nome no SQLite: tabela FTS5 externa (clients_fts) mantida por triggers, ordenada por bm25
+#   - sem nenhum dos dois: prefixo com LIKE
+import re
+
+from sqlalchemy import select, text, and_, table, column
+
+from .models import Client
+from .util import only_digits, fold_name
+
+MAX_LIMIT = 50
+MIN_DIGITS = 3
+FTS_TABLE = "clients_fts"
+
+_COLUMNS = (
+    Client.id, Client.name, Client.cpf, Client.phone, Client.email,
+    Client.store_id, Client.visits_balance,
+)
+_features: dict[str, bool] = {}
+
+
+# ======================================================
+# DDL (usado pelas migrações)
+# ======================================================
+
+def create_sqlite_fts(conn) -> bool:
+    """Cria clients_fts + triggers. Retorna False se o SQLite não tiver FTS5."""
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name_norm, content='clients', content_rowid='id', prefix='2 3')"
+        ))
+    except Exception:
+        return False
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, new.name_norm); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF name_norm ON clients BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, new.name_norm); END"
+    ))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def create_pg_trgm(conn) -> bool:
+    """Índice trigram no nome; sem permissão para a extensão, cai para prefixo."""
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_clients_name_trgm ON clients USING gin (name_norm gin_trgm_ops)"
+            ))
+        return True
+    except Exception:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_clients_name_prefix ON clients (name_norm text_pattern_ops)"
+        ))
+        return False
+
+
+# ======================================================
+# CONSULTA
+# ======================================================
+
+def _has_feature(db, dialect: str) -> bool:
+    if dialect not in _features:
+        if dialect == "sqlite":
+            sql = f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+        elif dialect == "postgresql":
+            sql = "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        else:
+            return False
+        _features[dialect] = db.execute(text(sql)).first() is not None
+    return _features[dialect]
+
+
+def _prefix_range(col, prefix: str):
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(col >= prefix, col < upper)
+
+
+def _row(r, match: str) -> dict:
+    return {
+        "id": r.id,
+        "name": r.name,
+        "cpf": r.cpf,
+        "phone": r.phone,
+        "email": r.email,
+        "store_id": r.store_id,
+        "visits_balance": int(r.visits_balance or 0),
+        "match": match,
+    }
+
+
+def _by_digits(db, digits: str, limit: int) -> list[dict]:
+    out, seen = [], set()
+    for col, label in ((Client.cpf_digits, "cpf"), (Client.phone_digits, "phone")):
+        rows = db.execute(
+            select(*_COLUMNS).where(_prefix_range(col, digits)).order_by(col).limit(limit)
+        ).all()
+        for r in rows:
+            if r.id not in seen and len(out) < limit:
+                seen.add(r.id)
+                out.append(_row(r, label))
+    return out
+
+
+def _by_name(db, folded: str, limit: int) -> list[dict]:
+    tokens = re.findall(r"\w+", folded)
+    if not tokens:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and _has_feature(db, dialect):
+        match = " ".join(f'"{t}"*' for t in tokens)
+        fts = table(FTS_TABLE, column("rowid"))
+        q = (
+            select(*_COLUMNS)
+            .join_from(Client, fts, fts.c.rowid == Client.id)
+            .where(text(f"{FTS_TABLE} MATCH :match"))
+            .order_by(text(f"bm25({FTS_TABLE})"))
+            .limit(limit)
+        )
+        rows = db.execute(q, {"match": match}).all()
+    elif dialect == "postgresql" and _has_feature(db, dialect):
+        cond = and_(*[Client.name_norm.like(f"%{t}%") for t in tokens])
+        q = (
+            select(*_COLUMNS)
+            .where(cond)
+            .order_by(text("similarity(clients.name_norm, :folded) DESC"), Client.name_norm)
+            .limit(limit)
+        )
+        rows = db.execute(q, {"folded": folded}).all()
+    else:
+        q = select(*_COLUMNS).where(_prefix_range(Client.name_norm, folded)).order_by(Client.name_norm).limit(limit)
+        rows = db.execute(q).all()
+    return [_row(r, "name") for r in rows]
+
+
+def search_clients(db, q: str, limit: int = 20) -> list[dict]:
+    """Resultados ordenados por relevância, de todas as lojas."""
+    limit = max(1, min(MAX_LIMIT, limit))
+    q = (q or "").strip()
+    digits = only_digits(q)
+    if digits and not re.search(r"[^\W\d_]", q):  # só dígitos e pontuação: CPF/telefone
+        return _by_digits(db, digits, limit) if len(digits) >= MIN_DIGITS else []
+    return _by_name(db, fold_name(q), limit)
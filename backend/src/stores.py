@@ -0,0 +1,63 @@
+# stores.py — lojas em memória (meta, nome, loja padrão)
+# A tabela stores tem poucas linhas e quase nunca muda, mas visita e resgate liam a
+# loja (e a "primeira loja" quando não há nenhuma) a cada requisição. O registro
+# carrega todas de uma vez e só recarrega quando config_versions["stores"] muda:
+# quem edita lojas chama bump_version() na mesma transação. Neste processo a troca
+# vale no commit; nos outros, na próxima conferência da versão.
+#
+# Env:
+#   STORE_VERSION_CHECK  segundos entre conferências da versão no banco (0 = toda chamada)
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import select
+
+from .models import Store
+from . import versions
+
+STORE_VERSION_CHECK = float(os.getenv("STORE_VERSION_CHECK", "5"))
+
+
+@dataclass(frozen=True)
+class StoreInfo:
+    id: int
+    name: str
+    meta_visitas: int | None
+
+
+class StoreRegistry:
+    def __init__(self, check_every: float = STORE_VERSION_CHECK):
+        self._watch = versions.VersionWatch("stores", check_every)
+        self._stores: dict[int, StoreInfo] = {}
+
+    def _current(self, db) -> dict[int, StoreInfo]:
+        if self._watch.poll(db):
+            rows = db.execute(select(Store.id, Store.name, Store.meta_visitas).order_by(Store.id)).all()
+            self._stores = {sid: StoreInfo(sid, name, meta) for sid, name, meta in rows}
+        return self._stores
+
+    def invalidate(self) -> None:
+        """Força a releitura na próxima chamada (depois do commit de uma edição)."""
+        self._watch.reset()
+
+    def get(self, db, store_id: int | None) -> StoreInfo | None:
+        return self._current(db).get(store_id) if store_id else None
+
+    def all(self, db) -> list[StoreInfo]:
+        return list(self._current(db).values())
+
+    def default_id(self, db) -> int | None:
+        """Primeira loja (por id): a que registra quando nem usuário nem cliente têm loja."""
+        return next(iter(self._current(db)), None)
+
+    def meta(self, db, store_id: int | None, default: int) -> int:
+        st = self.get(db, store_id)
+        return st.meta_visitas if st and st.meta_visitas else default
+
+
+registry = StoreRegistry()
+
+
+def bump_version(db) -> None:
+    """Marca as lojas como alteradas. Não faz commit (entra na transação do chamador)."""
+    versions.bump(db, "stores")
@@ -0,0 +1,98 @@
+# stresscheck.py — visitas e resgates concorrentes no MESMO CPF
+# Sobe um banco descartável (SQLite temporário por padrão, ou --database-url para um
+# Postgres de teste), dispara visitas e resgates em paralelo pelo test client do Flask
+# e confere os invariantes do saldo no fim. Sai com código 1 se algum falhar.
+#
+#   python -m src.stresscheck --threads 16 --ops 400
+#   python -m src.stresscheck --database-url postgresql://localhost/fidelidade_stress
+import argparse
+import random
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import harness
+
+CPF = "99988877766"
+
+
+def run(threads: int, ops: int, redeem_ratio: float, seed: int) -> int:
+    app, http = harness.seeded_client()
+    from sqlalchemy import select, func
+    from .main import DEFAULT_META
+    from .db import SessionLocal
+    from .models import Store, Client, Visit, Redemption
+
+    headers = harness.auth_headers(http, "gerente.mascote@cdc.com")
+    http.post("/api/clientes", json={"name": "Cliente Estresse", "cpf": CPF}, headers=headers)
+
+    db = SessionLocal()
+    meta = db.execute(select(Store.meta_visitas).where(Store.name == "Mascote")).scalar() or DEFAULT_META
+    db.close()
+    SessionLocal.remove()
+
+    # começa com saldo para alguns resgates
+    for _ in range(2 * meta):
+        http.post("/api/visitas", json={"cpf": CPF}, headers=headers)
+
+    rng = random.Random(seed)
+    plan = ["resgate" if rng.random() < redeem_ratio else "visita" for _ in range(ops)]
+
+    def call(kind):
+        client = app.test_client()
+        url = "/api/resgates" if kind == "resgate" else "/api/visitas"
+        try:
+            return kind, client.post(url, json={"cpf": CPF}, headers=headers).status_code
+        finally:
+            SessionLocal.remove()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = Counter(pool.map(call, plan))
+    for (kind, status), n in sorted(results.items()):
+        print(f"{kind:8} {status}: {n}")
+
+    db = SessionLocal()
+    c = db.execute(select(Client).where(Client.cpf == CPF)).scalar_one()
+    visits = db.execute(select(func.count(Visit.id)).where(Visit.client_id == c.id)).scalar()
+    open_visits = db.execute(
+        select(func.count(Visit.id)).where(Visit.client_id == c.id, Visit.redemption_id.is_(None))
+    ).scalar()
+    redemptions = db.execute(select(func.count(Redemption.id)).where(Redemption.client_id == c.id)).scalar()
+    per_redemption = db.execute(
+        select(Visit.redemption_id, func.count(Visit.id))
+        .where(Visit.client_id == c.id, Visit.redemption_id.is_not(None))
+        .group_by(Visit.redemption_id)
+    ).all()
+    db.close()
+
+    checks = [
+        ("visitas gravadas == 2*meta + visitas 200", visits == 2 * meta + results[("visita", 200)]),
+        ("resgates gravados == resgates 200", redemptions == results[("resgate", 200)]),
+        ("lifetime_visits == visitas gravadas", c.lifetime_visits == visits),
+        ("visits_balance == visitas em aberto", c.visits_balance == open_visits),
+        ("visits_balance >= 0", c.visits_balance >= 0),
+        ("cada resgate consumiu exatamente meta visitas",
+         len(per_redemption) == redemptions and all(n == meta for _, n in per_redemption)),
+        ("visitas == meta * resgates + saldo", visits == meta * redemptions + c.visits_balance),
+        ("nenhum erro 5xx", not any(status >= 500 for _, status in results)),
+    ]
+    for label, ok in checks:
+        print(("OK   " if ok else "FALHA") + " " + label)
+    print(f"meta={meta} visitas={visits} resgates={redemptions} saldo={c.visits_balance}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.stresscheck")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=400)
+    parser.add_argument("--redeem-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1)
+    harness.add_database_arg(parser)
+    args = parser.parse_args(argv)
+    harness.use_disposable_db(args.database_url, "stress", VISIT_COOLDOWN_SECONDS="0")
+    return run(args.threads, args.ops, args.redeem_ratio, args.seed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# sync.py — lote de visitas/resgates feitos no terminal da loja (inclusive offline)
+# Cada operação traz um UUID gerado no terminal e o horário em que aconteceu. O lote é
+# aplicado em ordem de horário numa única transação, reaproveitando loyalty.add_visit/
+# redeem, e devolve o resultado de cada operação e os saldos finais dos clientes.
+#
+# Conflitos:
+#   - UUID já gravado (reenvio depois de queda)     -> "duplicado", com o id original
+#   - CPF desconhecido / operação malformada         -> "rejeitado"
+#   - visita a menos de `cooldown` s de outra visita -> "rejeitado" (mesma leitura já
+#     registrada online ou por outro terminal)
+#   - resgate sem saldo na hora de aplicar           -> "rejeitado" (outra loja resgatou antes)
+#
+# Env:
+#   SYNC_MAX_OPS        operações por lote
+#   SYNC_MAX_AGE_HOURS  operações mais antigas que isso são rejeitadas (terminal com
+#                       relógio errado ou fila esquecida)
+import os
+import uuid as uuidlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from .models import Client, Visit, Redemption
+from . import loyalty, rollups, stores
+from .util import only_digits
+
+SYNC_MAX_OPS = int(os.getenv("SYNC_MAX_OPS", "500"))
+SYNC_MAX_AGE_HOURS = int(os.getenv("SYNC_MAX_AGE_HOURS", str(7 * 24)))
+KINDS = ("visita", "resgate")
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def _parse_at(value, now: datetime) -> datetime:
+    """ISO 8601 -> UTC sem fuso (como o resto do banco); horário no futuro vira agora."""
+    at = datetime.fromisoformat(str(value))
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(at, now)
+
+
+def _normalize(raw: list, now: datetime) -> tuple[list[dict], list[dict]]:
+    """Separa as operações válidas (ordenadas por horário) das rejeitadas na validação."""
+    oldest = now - timedelta(hours=SYNC_MAX_AGE_HOURS)
+    valid, rejected = [], []
+    for i, op in enumerate(raw):
+        op = op if isinstance(op, dict) else {}
+        try:
+            key = str(uuidlib.UUID(str(op.get("uuid"))))
+        except ValueError:
+            rejected.append({"index": i, "uuid": op.get("uuid"), "status": "rejeitado", "error": "uuid inválido"})
+            continue
+        kind = op.get("type")
+        cpf = only_digits(str(op.get("cpf") or ""))
+        try:
+            at = _parse_at(op.get("at"), now)
+        except ValueError:
+            at = None
+        error = (
+            "tipo inválido" if kind not in KINDS
+            else "cpf obrigatório" if not cpf
+            else "horário inválido" if at is None
+            else "operação antiga demais" if at < oldest
+            else None
+        )
+        if error:
+            rejected.append({"index": i, "uuid": key, "type": kind, "status": "rejeitado", "error": error})
+            continue
+        valid.append({"index": i, "uuid": key, "type": kind, "cpf": cpf, "at": at,
+                      "gift_name": (op.get("gift_name") or "").strip() or None})
+    valid.sort(key=lambda o: (o["at"], o["index"]))
+    return valid, rejected
+
+
+def apply_batch(db, raw: list, user_store_id: int | None, default_meta: int, gift_name: str,
+                cooldown: int) -> dict:
+    """Aplica o lote na transação de `db`. Não faz commit."""
+    if not isinstance(raw, list):
+        raise InvalidBatch("ops deve ser uma lista")
+    if len(raw) > SYNC_MAX_OPS:
+        raise InvalidBatch(f"no máximo {SYNC_MAX_OPS} operações por lote")
+    now = datetime.utcnow()
+    ops, results = _normalize(raw, now)
+
+    # reenvios: UUIDs que já estão gravados
+    keys = [o["uuid"] for o in ops]
+    seen = {k: ("visita", i) for k, i in db.execute(select(Visit.uuid, Visit.id).where(Visit.uuid.in_(keys)))}
+    seen.update({k: ("resgate", i) for k, i in
+                 db.execute(select(Redemption.uuid, Redemption.id).where(Redemption.uuid.in_(keys)))})
+
+    # trava os clientes do lote em ordem de id (dois lotes com os mesmos CPFs não se cruzam)
+    # CPF com ou sem máscara: compara os dígitos (o primeiro cadastro ganha, como em /api/visitas)
+    cpfs = sorted({o["cpf"] for o in ops})
+    clients = {}
+    for c in db.execute(
+        select(Client).where(Client.cpf_digits.in_(cpfs)).order_by(Client.id).with_for_update()
+    ).scalars():
+        clients.setdefault(c.cpf_digits, c)
+    # loja que registra: a do usuário, senão a do cliente, senão a primeira (como em /api/visitas)
+    first_store = stores.registry.default_id(db)
+
+    def store_of(c):
+        return user_store_id or c.store_id or first_store
+
+    bumps = Counter()
+    balances = {}
+    for o in ops:
+        result = {"index": o["index"], "uuid": o["uuid"], "type": o["type"]}
+        results.append(result)
+        if o["uuid"] in seen:
+            kind, obj_id = seen[o["uuid"]]
+            result.update(status="duplicado", **{"visit_id" if kind == "visita" else "redemption_id": obj_id})
+            continue
+        c = clients.get(o["cpf"])
+        if c is None:
+            result.update(status="rejeitado", error="Cliente não encontrado")
+            continue
+        store_id = store_of(c)
+        meta = stores.registry.meta(db, store_id, default_meta)
+
+        if o["type"] == "visita":
+            if cooldown > 0 and loyalty.recent_visit(db, c.id, cooldown, at=o["at"]):
+                result.update(status="rejeitado", error="Visita já registrada para este cliente nesse horário")
+                continue
+            v, balance = loyalty.add_visit(db, c, store_id, created_at=o["at"], uuid=o["uuid"])
+            bumps[(store_id, o["at"].date(), "visits")] += 1
+            result.update(status="aplicado", visit_id=v.id)
+        else:
+            r, balance = loyalty.redeem(db, c, store_id, meta, o["gift_name"] or gift_name,
+                                        created_at=o["at"], uuid=o["uuid"])
+            if r is None:
+                result.update(status="rejeitado", error="Cliente ainda não atingiu a meta",
+                              visits_count=balance, meta=int(meta))
+                continue
+            bumps[(store_id, o["at"].date(), "redemptions")] += 1
+            result.update(status="aplicado", redemption_id=r.id)
+        seen[o["uuid"]] = (o["type"], result.get("visit_id") or result.get("redemption_id"))
+        balances[c.id] = {"client_id": c.id, "cpf": c.cpf, "visits_count": balance, "meta": int(meta),
+                           "eligible": balance >= meta}
+
+    # ordem fixa (loja, dia): dois lotes simultâneos travam as linhas do rollup na
+    # mesma sequência e não entram em deadlock
+    for (store_id, day, field), n in sorted(bumps.items(), key=lambda kv: (kv[0][0] or rollups.NO_STORE, *kv[0][1:])):
+        rollups.bump(db, store_id, day=day, **{field: n})
+
+    # saldo também dos clientes que só tiveram duplicados/rejeições (o terminal atualiza a tela)
+    rest = [c.id for c in clients.values() if c.id not in balances]
+    for cid, cpf, balance, store_id in db.execute(
+        select(Client.id, Client.cpf, Client.visits_balance, Client.store_id).where(Client.id.in_(rest))
+    ):
+        meta = stores.registry.meta(db, user_store_id or store_id or first_store, default_meta)
+        balances[cid] = {"client_id": cid, "cpf": cpf, "visits_count": int(balance or 0), "meta": int(meta),
+                         "eligible": (balance or 0) >= meta}
+
+    results.sort(key=lambda r: r.pop("index"))  # na ordem em que vieram
+    return {
+        "results": results,
+        "applied": sum(r["status"] == "aplicado" for r in results),
+        "balances": list(balances.values()),
+    }
@@ -0,0 +1,71 @@
+# synthetic.py — massa de dados sintética para checagem de planos e benchmarks
+# Usa as lojas já cadastradas (rode o seed antes) e insere clientes/visitas em lote.
+import random
+from datetime import datetime, timedelta, date
+
+from sqlalchemy import select, insert, func
+
+from .models import Store, Client, Visit
+from . import loyalty, rollups
+
+FIRST_NAMES = ["Ana", "Maria", "José", "João", "Antônio", "Francisca", "Carlos", "Paulo",
+               "Lúcia", "Pedro", "Luiz", "Marcos", "Juliana", "Patrícia", "Fernanda", "Márcia"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves",
+              "Pereira", "Lima", "Gomes", "Conceição", "Ribeiro", "Araújo", "Gonçalves"]
+
+
+def _client_row(rng: random.Random, n: int, store_ids: list[int], now: datetime) -> dict:
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    birthday = date(rng.randint(1950, 2005), rng.randint(1, 12), rng.randint(1, 28))
+    cpf = f"9{n:010d}"
+    phone = f"11 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"
+    return {
+        "name": name,
+        "cpf": cpf,
+        "phone": phone,
+        "email": f"cliente{n}@example.com" if rng.random() < 0.6 else None,
+        "birthday": birthday,
+        "store_id": rng.choice(store_ids),
+        "created_at": now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+        "visits_balance": 0,
+        "lifetime_visits": 0,
+        **Client.derived(name=name, cpf=cpf, phone=phone, birthday=birthday),
+    }
+
+
+def populate(db, clients: int = 20000, visits: int = 100000, seed: int = 42,
+             batch: int = 5000, log=None) -> dict:
+    """Insere `clients` clientes e `visits` visitas aleatórias e recalcula saldos e rollups."""
+    rng = random.Random(seed)
+    store_ids = list(db.execute(select(Store.id)).scalars())
+    if not store_ids:
+        raise RuntimeError("nenhuma loja cadastrada; rode o seed antes")
+    now = datetime.utcnow()
+    start = (db.execute(select(func.max(Client.id))).scalar() or 0) + 1
+
+    for i in range(0, clients, batch):
+        rows = [_client_row(rng, start + i + j, store_ids, now) for j in range(min(batch, clients - i))]
+        db.execute(insert(Client), rows)
+        db.commit()
+        if log:
+            log(f"clientes: {i + len(rows)}/{clients}")
+
+    lo, hi = db.execute(select(func.min(Client.id), func.max(Client.id))).one()
+    for i in range(0, visits, batch):
+        rows = [
+            {
+                "client_id": rng.randint(lo, hi),
+                "store_id": rng.choice(store_ids),
+                "created_at": now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            }
+            for _ in range(min(batch, visits - i))
+        ]
+        db.execute(insert(Visit), rows)
+        db.commit()
+        if log:
+            log(f"visitas: {i + len(rows)}/{visits}")
+
+    loyalty.reconcile_balances(db)
+    rollups.rebuild(db)
+    db.commit()
+    return {"clients": clients, "visits": visits, "stores": len(store_ids)}
@@ -1,8 +1,67 @@
-# util.py — usar PBKDF2 (compatível no Windows) em vez de bcrypt
-from passlib.hash import pbkdf2_sha256
+# util.py — utilitários sem estado (hash de senha fica em passwords.py)
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 
-def hash_password(p: str) -> str:
-    return pbkdf2_sha256.hash(p)
 
-def verify_password(p: str, hashed: str) -> bool:
-    return pbkdf2_sha256.verify(p, hashed)
+def only_digits(value: str | None) -> str:
+    return "".join(ch for ch in (value or "") if ch.isdigit())
+
+def fold_name(value: str | None) -> str:
+    """Minúsculas, sem acentos e com espaços normalizados (para busca)."""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    plain = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(plain.lower().split())
+
+def format_phone_to_wa(phone: str | None) -> str | None:
+    """Telefone no formato do wa.me (só dígitos, com DDI 55)."""
+    if not phone:
+        return None
+    digits = only_digits(phone)
+    if len(digits) < 10:
+        return None
+    if not digits.startswith("55"):
+        digits = "55" + digits
+    return digits
+
+
+class TTLCache:
+    """LRU com expiração por item, seguro entre threads."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,41 @@
+# versions.py — carimbos de versão (config_versions) dos caches em memória
+# Quem altera algo cacheado (lojas, usuários) chama bump() na mesma transação; cada
+# processo confere a versão no máximo a cada `check_every` segundos e descarta o
+# cache quando ela muda. Uma consulta a cada poucos segundos por processo, não por
+# requisição.
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from .models import ConfigVersion
+
+
+def bump(db, name: str) -> None:
+    """Marca `name` como alterado. Não faz commit (entra na transação do chamador)."""
+    db.execute(update(ConfigVersion).where(ConfigVersion.name == name).values(version=ConfigVersion.version + 1))
+
+
+class VersionWatch:
+    def __init__(self, name: str, check_every: float):
+        self.name = name
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._checked_at = 0.0
+
+    def poll(self, db) -> bool:
+        """True se a versão mudou desde a última leitura (ou nunca foi lida)."""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_every:
+            return False
+        version = db.execute(select(ConfigVersion.version).where(ConfigVersion.name == self.name)).scalar() or 0
+        with self._lock:
+            changed = version != self._version
+            self._version, self._checked_at = version, now
+        return changed
+
+    def reset(self) -> None:
+        """Força a releitura na próxima chamada (o processo que editou, depois do commit)."""
+        with self._lock:
+            self._version = None
@@ -57,13 +57,14 @@ export default function App(){
 
   function onLoginSuccess(payload){
     localStorage.setItem('token', payload.token)
+    localStorage.setItem('refresh_token', payload.refresh_token)
     localStorage.setItem('user', JSON.stringify(payload.user))
     api.setToken(payload.token)
     setUser(payload.user)
     navigate('/')
   }
   function onLogout(){
-    localStorage.clear()
+    api.clearAuth()
     setUser(null)
     navigate('/login')
   }
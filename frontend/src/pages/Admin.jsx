@@ -91,6 +91,21 @@ export default function Admin(){
     }
   }
 
+  async function saveMeta(s){
+    setMsg(''); setErr('')
+    try{
+      const r = await api.put(`/api/admin/stores/${s.id}`, { meta_visitas: Number(s.meta_visitas) })
+      setStores(list=> list.map(x=> x.id===s.id ? r.data : x))
+      setMsg(`Meta da loja ${r.data.name} atualizada.`)
+    }catch(e){
+      setErr(e?.response?.data?.error || 'Erro ao atualizar loja')
+    }
+  }
+
+  function onMetaChange(id, value){
+    setStores(list=> list.map(x=> x.id===id ? {...x, meta_visitas: value} : x))
+  }
+
   const storeName = (id) => id ? (stores.find(s=>s.id===id)?.name || id) : 'Todas'
 
   return (
@@ -127,6 +142,28 @@ export default function Admin(){
         {err && <p style={{color:'crimson', marginTop:8}}>{err}</p>}
       </div>
 
+      <div className="card" style={{marginTop:16}}>
+        <h3>Lojas</h3>
+        <div className="table">
+          <div className="tr head">
+            <div className="td">Loja</div>
+            <div className="td">Meta de visitas</div>
+            <div className="td" style={{textAlign:'right'}}>Ações</div>
+          </div>
+          {stores.map(s=> (
+            <div className="tr" key={s.id}>
+              <div className="td">{s.name}</div>
+              <div className="td">
+                <input type="number" min="1" value={s.meta_visitas ?? ''} onChange={e=>onMetaChange(s.id, e.target.value)} style={{width:80}} />
+              </div>
+              <div className="td" style={{textAlign:'right'}}>
+                <button className="btn ghost" onClick={()=>saveMeta(s)}>Salvar</button>
+              </div>
+            </div>
+          ))}
+        </div>
+      </div>
+
       <div className="card" style={{marginTop:16}}>
         <h3>Usuários</h3>
         <div className="table">
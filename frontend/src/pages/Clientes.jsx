@@ -2,17 +2,29 @@ import React, { useEffect, useState } from 'react'
 import api from '../services/api'
 
 export default function Clientes(){
-  const [cpf,setCpf] = useState('')
+  const [busca,setBusca] = useState('')
+  const [termo,setTermo] = useState('')  // busca depois do debounce
   const [page,setPage] = useState(1)
   const [items,setItems] = useState([])
   const [total,setTotal] = useState(0)
   const [form,setForm] = useState({name:'',cpf:'',phone:'',email:'',birthday:''})
 
   async function load(){
-    const r = await api.get('/api/clientes?cpf='+encodeURIComponent(cpf)+'&page='+page+'&per_page=10')
+    if (termo.length >= 2) {
+      // busca por nome, CPF ou telefone (prefixo) no servidor
+      const r = await api.get('/api/clientes/busca?q='+encodeURIComponent(termo)+'&limit=20')
+      setItems(r.data.items); setTotal(r.data.items.length)
+      return
+    }
+    const r = await api.get('/api/clientes?page='+page+'&per_page=10')
     setItems(r.data.items); setTotal(r.data.total)
   }
-  useEffect(()=>{ load() },[page])
+  // um único efeito carrega; o da busca só aplica o debounce e volta à página 1
+  useEffect(()=>{ load() },[page, termo])
+  useEffect(()=>{
+    const t = setTimeout(()=>{ setTermo(busca.trim()); setPage(1) }, 250)
+    return ()=>clearTimeout(t)
+  },[busca])
 
   async function create(e){
     e.preventDefault()
@@ -38,8 +50,8 @@ export default function Clientes(){
       </div>
 
       <div className="card">
-        <label>Buscar por CPF</label>
-        <input value={cpf} onChange={e=>setCpf(e.target.value)} placeholder="000.000.000-00" />
+        <label>Buscar por nome, CPF ou telefone</label>
+        <input value={busca} onChange={e=>setBusca(e.target.value)} placeholder="Maria, 000.000.000-00 ou (11) 9..." />
         <button className="btn" style={{marginTop:8}} onClick={()=>{setPage(1); load()}}>Buscar</button>
       </div>
       <table className="card">
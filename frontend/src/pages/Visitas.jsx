@@ -1,17 +1,37 @@
-import React, { useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import api from '../services/api'
+import { enqueue, flush, pendingCount } from '../services/syncQueue'
 
 export default function Visitas(){
   const [cpf,setCpf] = useState('')
   const [resp,setResp] = useState(null)
   const [err,setErr] = useState(null)
+  // mesma chave para cliques repetidos/retentativas do mesmo registro; nova após sucesso ou troca de CPF
+  const idemKey = useRef(null)
+  const [pendentes,setPendentes] = useState(pendingCount())
+
+  useEffect(()=>{
+    flush().then(()=>setPendentes(pendingCount()))
+    const t = setInterval(()=>setPendentes(pendingCount()), 5000)
+    return ()=>clearInterval(t)
+  },[])
 
   async function registrar(){
     setErr(null); setResp(null)
+    if(!idemKey.current) idemKey.current = crypto.randomUUID()
     try{
-      const r = await api.post('/api/visitas', { cpf })
+      const r = await api.post('/api/visitas', { cpf }, { headers: { 'Idempotency-Key': idemKey.current } })
       setResp(r.data)
+      idemKey.current = null
     }catch(e){
+      if(!e?.response){
+        // sem conexão: guarda no terminal e envia por /api/sync quando a rede voltar
+        enqueue('visita', cpf)
+        idemKey.current = null
+        setPendentes(pendingCount())
+        setErr('Sem conexão: visita guardada no terminal e será enviada automaticamente.')
+        return
+      }
       setErr(e?.response?.data?.error || 'Erro ao registrar')
     }
   }
@@ -21,9 +41,10 @@ export default function Visitas(){
       <h2 style={{color:'var(--vinho)'}}>Registrar Visita</h2>
       <div className="card">
         <label>CPF</label>
-        <input value={cpf} onChange={e=>setCpf(e.target.value)} placeholder="CPF do cliente" />
+        <input value={cpf} onChange={e=>{ setCpf(e.target.value); idemKey.current = null }} placeholder="CPF do cliente" />
         <button className="btn" onClick={registrar} style={{marginTop:8}}>Registrar</button>
         {err && <p style={{color:'crimson'}}>{err}</p>}
+        {pendentes > 0 && <p className="pill">{pendentes} registro(s) aguardando conexão</p>}
         {resp && <div style={{marginTop:8}}>
           <div className="card">
             <b>Cliente:</b> {resp.client?.name} — {resp.client?.cpf}<br/>
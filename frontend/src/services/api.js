@@ -8,16 +8,51 @@ export function setToken(token) {
   api.defaults.headers.common['Authorization'] = 'Bearer ' + token
 }
 
+// logout: só as chaves de sessão; a fila offline (sync_queue) continua no terminal
+export function clearAuth() {
+  for (const key of ['token', 'refresh_token', 'user', 'cdc_user']) localStorage.removeItem(key)
+  delete api.defaults.headers.common['Authorization']
+}
+
+// token de acesso vencido: troca o refresh_token por um par novo (uma vez) e repete
+let refreshing = null
+function refreshToken() {
+  const refresh = localStorage.getItem('refresh_token')
+  if (!refresh) return Promise.reject(new Error('sem refresh token'))
+  refreshing = refreshing || axios
+    .post((import.meta.env.VITE_API_BASE || '') + '/api/auth/refresh', null, {
+      headers: { Authorization: 'Bearer ' + refresh }
+    })
+    .then(({ data }) => {
+      localStorage.setItem('token', data.token)
+      localStorage.setItem('refresh_token', data.refresh_token)
+      localStorage.setItem('user', JSON.stringify(data.user))
+      setToken(data.token)
+      return data.token
+    })
+    .finally(() => { refreshing = null })
+  return refreshing
+}
+
 api.interceptors.response.use(
   (r) => r,
-  (err) => {
+  async (err) => {
     const code = err?.response?.status
+    const config = err?.config
+    if (code === 401 && config && !config._retried && !config.url?.includes('/api/auth/')) {
+      try {
+        const token = await refreshToken()
+        config._retried = true
+        config.headers = { ...config.headers, Authorization: 'Bearer ' + token }
+        return api(config)
+      } catch (_) { /* cai no logout abaixo */ }
+    }
     if (code === 401 || code === 422) {
-      localStorage.clear()
+      clearAuth()
       if (!location.pathname.includes('/login')) location.href = '/login'
     }
     return Promise.reject(err)
   }
 )
 
-export default Object.assign(api, { setToken })
\ No newline at end of file
+export default Object.assign(api, { setToken, clearAuth })
\ No newline at end of file
@@ -0,0 +1,43 @@
+import api from './api'
+
+// Fila offline do terminal: visitas/resgates que não chegaram ao servidor ficam no
+// localStorage (com UUID e horário do terminal) e vão em lote para /api/sync quando
+// a conexão volta. O UUID torna o reenvio seguro (o servidor responde "duplicado").
+const KEY = 'sync_queue'
+
+function load(){
+  try { return JSON.parse(localStorage.getItem(KEY) || '[]') } catch (_) { return [] }
+}
+function save(ops){
+  localStorage.setItem(KEY, JSON.stringify(ops))
+}
+
+export function pendingCount(){
+  return load().length
+}
+
+export function enqueue(type, cpf, extra = {}){
+  const op = { uuid: crypto.randomUUID(), type, cpf, at: new Date().toISOString(), ...extra }
+  save([...load(), op])
+  return op
+}
+
+let flushing = null
+export function flush(){
+  const ops = load()
+  // sem sessão não envia: o 401 derrubaria o login e a fila espera o próximo
+  if (!ops.length || !navigator.onLine || !localStorage.getItem('token')) return Promise.resolve(null)
+  flushing = flushing || api.post('/api/sync', { ops })
+    .then(({ data }) => {
+      // sai da fila tudo o que o servidor resolveu (aplicado, duplicado ou rejeitado)
+      const done = new Set(data.results.map(r => r.uuid))
+      save(load().filter(op => !done.has(op.uuid)))
+      return data
+    })
+    .catch(() => null)
+    .finally(() => { flushing = null })
+  return flushing
+}
+
+window.addEventListener('online', flush)
+setInterval(flush, 30000)